@@ -14,4 +14,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thewall.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from wall_tracker_mp.warmup import lifespan
+
+
+# Django does not speak the lifespan protocol, it is used to warm up /mp endpoints at startup
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'wall_tracker.middleware.RequestIdMiddleware',
+    'wall_tracker.middleware.AdmissionMiddleware',
     'wall_tracker.middleware.DisallowPostMiddleware',
     'django.middleware.common.CommonMiddleware',
 ]
@@ -106,6 +107,37 @@ DATABASES = {
 }
 
 
+# Engine computing wall_tracker responses: 'memory' (in-process snapshot reloaded on import),
+# 'aggregates' (precomputed at import), 'mmap' (profile store shared by server processes),
+# 'histogram', 'numpy' or 'sql' (computed from profiles on request)
+WALL_TRACKER_BACKEND = 'memory'
+# Rewritten by import_profile to let server processes know the profiles changed
+WALL_TRACKER_DATASET_VERSION_FILE = BASE_DIR / 'dataset.version'
+# Binary copy of profiles written by import_profile and memory-mapped by server processes
+WALL_TRACKER_PROFILE_STORE_FILE = BASE_DIR / 'profiles.bin'
+# Blocking DB and compute work of the views runs on at most WORKERS threads at a time, at most 
+# QUEUE_SIZE requests wait for one and give up after DEADLINE seconds, the rest get 503 at once
+WALL_TRACKER_EXECUTOR_WORKERS = 8
+WALL_TRACKER_EXECUTOR_QUEUE_SIZE = 64
+WALL_TRACKER_EXECUTOR_DEADLINE = 5.0
+# Engine computing the team schedule for /mp endpoints: 'process' (Manager with the teams sharing a pool
+# of WALL_TRACKER_MP_PROCESSES worker processes) or 'analytic' (same schedule computed in-process)
+WALL_TRACKER_MP_ENGINE = 'process'
+# Worker processes the teams of the 'process' engine are spread over, None for os.cpu_count()
+WALL_TRACKER_MP_PROCESSES = None
+# Channels between the manager and worker processes: 'queue' (mp.Queue), 'pipe' or 'ring' (shared memory)
+WALL_TRACKER_MP_TRANSPORT = 'queue'
+# Computed schedules keyed by a hash of profiles and team count, least recently used ones 
+# are evicted once the directory grows over the size given in bytes
+WALL_TRACKER_MP_CACHE_DIR = BASE_DIR / 'schedules'
+WALL_TRACKER_MP_CACHE_SIZE = 256 * 1024 * 1024
+# Answer /mp requests coming before the schedule is computed by simulating up to the day asked,
+# the rest is computed in the background
+WALL_TRACKER_MP_LAZY = True
+# Compute the mp schedule in the background as soon as the ASGI server starts
+WALL_TRACKER_MP_WARM_UP = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
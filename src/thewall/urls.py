@@ -19,8 +19,9 @@ from django.urls import path, include, re_path
 from django.conf.urls import handler400, handler404, handler500
 
 from wall_tracker.views import (ProfileDailyIceVolumeView, ProfileDailyCostView, 
-                                AllProfilesDailyCostView, TotalWallCostView, 
+                                AllProfilesDailyCostView, TotalWallCostView, ExecutorStatsView,
                                 NotFoundView, BadRequestView, InternalServerErrorView)
+from wall_tracker_mp.views import ReadyView
 
 urlpatterns = [
     path('profiles/<int:profile_id>/days/<int:day>/', ProfileDailyIceVolumeView.as_view(), name='daily-ice-amount'),
@@ -28,6 +29,8 @@ urlpatterns = [
     path('profiles/overview/<int:day>/', AllProfilesDailyCostView.as_view(), name='all-profiles-daily-cost'),
     path('profiles/overview/', TotalWallCostView.as_view(), name='total-wall-cost'),
     path('mp/', include('wall_tracker_mp.urls')),
+    re_path(r'^ready/?$', ReadyView.as_view(), name='ready'),
+    re_path(r'^stats/?$', ExecutorStatsView.as_view(), name='stats'),
     # NOTE: This make failing tests pass, but then some /mp tests fails.
     # NOTE: Looks like it's django bug. When this is off some requests that has to resolve to 404 actually 
     # NOTE: handled on django level and are not passed over to app. If uncomment this then some /mp routes 
@@ -0,0 +1,190 @@
+from django.conf import settings
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import asyncio
+import contextlib
+import threading
+import time
+import logging
+
+
+_logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+def _set_result(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# Admission control for blocking DB and compute work. At most workers_num slots are held at a time,
+# at most queue_size more callers wait for one in arrival order; a caller finding the queue full is
+# rejected at once and one waiting longer than deadline seconds gives up. Both raise Overloaded.
+# The deadline bounds the wait only, a caller that got a slot runs to the end. Threads and coroutines
+# share the slots, coroutines wait on the event loop without holding a thread.
+class Executor:
+    def __init__(self, workers_num, queue_size, deadline):
+        self.__workers_num = workers_num
+        self.__queue_size = queue_size
+        self.__deadline = deadline
+        self.__free = workers_num
+        self.__waiters = deque()
+        self.__executor = None
+        self.__lock = threading.Lock()
+        self.__running = 0
+        self.__admitted = self.__rejected = self.__expired = self.__cancelled = 0
+
+
+    # Returns None if a slot has been taken at once, otherwise the waiter queued
+    def __admit(self, make_wake):
+        with self.__lock:
+            if self.__free and not self.__waiters:
+                self.__free -= 1
+                self.__running += 1
+                self.__admitted += 1
+                return None
+
+            if len(self.__waiters) >= self.__queue_size:
+                self.__rejected += 1
+                raise Overloaded(f'Queue is full: [{len(self.__waiters)}]')
+
+            waiter = _Waiter(make_wake())
+            self.__waiters.append(waiter)
+            self.__admitted += 1
+            return waiter
+
+
+    # Takes the waiter out of the queue, returns False if the slot has been handed over to it meanwhile
+    def __withdraw(self, waiter, expired):
+        with self.__lock:
+            if waiter.granted:
+                return False
+
+            self.__waiters.remove(waiter)
+            if expired:
+                self.__expired += 1
+            else:
+                self.__cancelled += 1
+
+            return True
+
+
+    # Gives up waiting unless the slot has been handed over meanwhile
+    def __expire(self, waiter):
+        if self.__withdraw(waiter, expired=True):
+            raise Overloaded(f'Deadline exceeded: [{self.__deadline}s]')
+
+
+    # The slot goes straight to the first waiter if any
+    def __release(self):
+        with self.__lock:
+            if self.__waiters:
+                waiter = self.__waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self.__running -= 1
+                self.__free += 1
+
+
+    def __acquire(self):
+        event = threading.Event()
+        waiter = self.__admit(lambda: event.set)
+        if waiter is not None and not event.wait(self.__deadline):
+            self.__expire(waiter)
+
+
+    async def __acquire_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self.__admit(lambda: lambda: loop.call_soon_threadsafe(_set_result, future))
+        if waiter is None:
+            return
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.__deadline)
+        except asyncio.TimeoutError:
+            self.__expire(waiter)
+        except asyncio.CancelledError:
+            # E.g. the client has gone. A slot handed over meanwhile is passed on.
+            if not self.__withdraw(waiter, expired=False):
+                self.__release()
+
+            raise
+
+
+    # Holds a slot in the calling thread for the block
+    @contextlib.contextmanager
+    def slot(self):
+        self.__acquire()
+        try:
+            yield
+        finally:
+            self.__release()
+
+
+    # Same as slot() for coroutines, the event loop is not blocked while waiting
+    @contextlib.asynccontextmanager
+    async def async_slot(self):
+        await self.__acquire_async()
+        try:
+            yield
+        finally:
+            self.__release()
+
+
+    # Runs fn in the calling thread once a slot is free
+    def call(self, fn, *args):
+        with self.slot():
+            return fn(*args)
+
+
+    # Runs fn on one of the executor threads once a slot is free
+    async def run(self, fn, *args):
+        async with self.async_slot():
+            with self.__lock:
+                if self.__executor is None:
+                    self.__executor = ThreadPoolExecutor(self.__workers_num, thread_name_prefix='wall-tracker-executor')
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.__executor, fn, *args)
+
+
+    def shutdown(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+
+
+    def stats(self):
+        with self.__lock:
+            return dict(workers=self.__workers_num, queue_size=self.__queue_size,
+                        running=self.__running, waiting=len(self.__waiters),
+                        admitted=self.__admitted, rejected=self.__rejected, expired=self.__expired,
+                        cancelled=self.__cancelled)
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = Executor(settings.WALL_TRACKER_EXECUTOR_WORKERS, settings.WALL_TRACKER_EXECUTOR_QUEUE_SIZE,
+                                 settings.WALL_TRACKER_EXECUTOR_DEADLINE)
+            _logger.info(f'Executor created: [workers: {settings.WALL_TRACKER_EXECUTOR_WORKERS}; '
+                         f'queue size: {settings.WALL_TRACKER_EXECUTOR_QUEUE_SIZE}; '
+                         f'deadline: {settings.WALL_TRACKER_EXECUTOR_DEADLINE}s]')
+
+        return _executor
@@ -0,0 +1,161 @@
+import pytest
+import asyncio
+import threading
+import time
+
+from wall_tracker import admission
+from wall_tracker.admission import Executor, Overloaded, get_executor
+
+
+@pytest.fixture(autouse=True)
+def executor(monkeypatch):
+    monkeypatch.setattr(admission, '_executor', None)
+    yield
+    if admission._executor is not None:
+        admission._executor.shutdown()
+
+
+def hold(executor, started, release):
+    def blocked():
+        started.set()
+        release.wait()
+
+    thread = threading.Thread(target=executor.call, args=(blocked,))
+    thread.start()
+    assert started.wait(5)
+    return thread
+
+
+def test_call_must_run_in_calling_thread():
+    executor = Executor(2, 2, 1.0)
+    assert executor.call(threading.current_thread) is threading.current_thread()
+    assert executor.stats() == dict(workers=2, queue_size=2, running=0, waiting=0, admitted=1, rejected=0, expired=0,
+                                    cancelled=0)
+
+
+def test_full_queue_must_be_rejected_at_once():
+    executor = Executor(1, 0, 10.0)
+    started, release = threading.Event(), threading.Event()
+    thread = hold(executor, started, release)
+
+    start = time.monotonic()
+    with pytest.raises(Overloaded):
+        executor.call(int)
+    assert time.monotonic() - start < 1
+
+    release.set()
+    thread.join()
+    assert executor.stats()['rejected'] == 1
+    assert executor.call(int, '1') == 1
+
+
+def test_waiting_call_must_give_up_after_deadline():
+    executor = Executor(1, 1, 0.2)
+    started, release = threading.Event(), threading.Event()
+    thread = hold(executor, started, release)
+
+    with pytest.raises(Overloaded):
+        executor.call(int)
+
+    release.set()
+    thread.join()
+    stats = executor.stats()
+    assert (stats['expired'], stats['waiting'], stats['running']) == (1, 0, 0)
+
+
+def test_run_must_bound_concurrency():
+    executor = Executor(2, 10, 5.0)
+    running = list()
+    peak = list()
+
+    def work(i):
+        running.append(i)
+        peak.append(len(running))
+        time.sleep(0.02)
+        running.remove(i)
+        return i
+
+    async def requests():
+        return await asyncio.gather(*(executor.run(work, i) for i in range(12)), return_exceptions=True)
+
+    assert asyncio.run(requests()) == list(range(12))
+    assert max(peak) <= 2
+
+
+def test_run_must_reject_over_queue_size():
+    executor = Executor(1, 10, 5.0)
+    started, release = threading.Event(), threading.Event()
+    thread = hold(executor, started, release)
+
+    async def requests():
+        tasks = [asyncio.ensure_future(executor.run(int, '1')) for _ in range(20)]
+        await asyncio.sleep(0.1)
+        assert executor.stats()['waiting'] == 10
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(requests())
+    thread.join()
+    assert sum(isinstance(result, Overloaded) for result in results) == 10
+    assert results.count(1) == 10
+    assert executor.stats()['rejected'] == 10
+
+
+def test_waiting_coroutine_must_not_block_loop():
+    executor = Executor(1, 1, 5.0)
+    started, release = threading.Event(), threading.Event()
+    thread = hold(executor, started, release)
+    ticks = list()
+
+    async def waiting():
+        async with executor.async_slot():
+            return len(ticks)
+
+    async def requests():
+        task = asyncio.ensure_future(waiting())
+        await asyncio.sleep(0)
+        for _ in range(10):
+            ticks.append(executor.stats()['waiting'])
+            await asyncio.sleep(0.01)
+
+        release.set()
+        return await task
+
+    assert asyncio.run(requests()) == 10
+    thread.join()
+    assert ticks == [1] * 10
+
+
+def test_cancelled_waiter_must_pass_slot_on():
+    executor = Executor(1, 2, 5.0)
+
+    async def requests():
+        order = list()
+
+        async def request(i, hold_for):
+            async with executor.async_slot():
+                order.append(i)
+                await asyncio.sleep(hold_for)
+
+        first = asyncio.ensure_future(request(1, 0.05))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(request(2, 0))
+        third = asyncio.ensure_future(request(3, 0))
+        await asyncio.sleep(0)
+        second.cancel()
+        await asyncio.gather(first, third, return_exceptions=True)
+        return order
+
+    assert asyncio.run(requests()) == [1, 3]
+    stats = executor.stats()
+    # A cancelled waiter is not a deadline overrun
+    assert (stats['running'], stats['waiting'], stats['expired'], stats['cancelled']) == (0, 0, 0, 1)
+
+
+def test_executor_must_be_made_once_from_settings(settings):
+    settings.WALL_TRACKER_EXECUTOR_WORKERS = 3
+    executor = get_executor()
+    assert executor.stats()['workers'] == 3
+
+    settings.WALL_TRACKER_EXECUTOR_WORKERS = 4
+    assert get_executor() is executor
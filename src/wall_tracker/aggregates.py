@@ -0,0 +1,118 @@
+from django.db import connection
+
+from wall_tracker.models import WallProfile, DailyAggregate, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker.histogram import ICE_VOLUME_PER_DAY, ICE_UNIT_COST, MAX_BUILD_DAYS, make_histogram
+
+import itertools
+
+
+# No work is done past this day, so aggregates are stored for days 1..AGGREGATE_DAYS only
+AGGREGATE_DAYS = MAX_BUILD_DAYS
+BATCH_SIZE = 1000
+
+
+# Returns (profile_id, day, ice_amount, cost) rows for days 1..AGGREGATE_DAYS
+def make_aggregates(profile_id, histogram):
+    # below[i] is the number of sections of height MIN_WALL_HEIGHT + i or lower, 
+    # these are in work until day MAX_WALL_HEIGHT - (MIN_WALL_HEIGHT + i)
+    below = list(itertools.accumulate(histogram))
+    rows = list()
+    for day in range(1, AGGREGATE_DAYS + 1):
+        ice_amount = below[MAX_WALL_HEIGHT - day - MIN_WALL_HEIGHT] * ICE_VOLUME_PER_DAY
+        rows.append((profile_id, day, ice_amount, ice_amount * ICE_UNIT_COST))
+
+    return rows
+
+
+# Model instances are bypassed as building them dominates the import time
+INSERT_QUERY = (f'INSERT INTO {DailyAggregate._meta.db_table} (profile_id, day, ice_amount, cost) '
+                f'VALUES (%s, %s, %s, %s)')
+
+
+def insert_aggregates(rows):
+    with connection.cursor() as cursor:
+        cursor.executemany(INSERT_QUERY, rows)
+
+
+# Writes aggregates of the profiles added and removed keeping the all-profile rows up to date. Either 
+# replaces all the aggregates or, with replace=False, only the ones of the profiles removed and added. 
+# Use it in the same transaction that changes profiles to keep both consistent.
+class AggregatesWriter:
+    def __init__(self, replace=True):
+        self.__daily = [0] * (AGGREGATE_DAYS + 1)
+        self.__batch = list()
+        if replace:
+            DailyAggregate.objects.all().delete()
+            self.__profiles_num = 0
+            return
+
+        for day, ice_amount in DailyAggregate.objects.filter(profile_id=None, day__isnull=False).values_list('day', 'ice_amount'):
+            self.__daily[day] = ice_amount
+
+        self.__profiles_num = DailyAggregate.objects.filter(profile_id__isnull=False, day=1).count()
+
+
+    def __flush(self):
+        insert_aggregates(self.__batch)
+        self.__batch = list()
+
+
+    def add(self, profile_id, heights):
+        rows = make_aggregates(profile_id, make_histogram(heights))
+        for _, day, ice_amount, _ in rows:
+            self.__daily[day] += ice_amount
+
+        self.__profiles_num += 1
+        self.__batch.extend(rows)
+        if len(self.__batch) >= BATCH_SIZE:
+            self.__flush()
+
+
+    # Must be called before the profiles are added again
+    def remove(self, profile_ids):
+        profile_ids = list(profile_ids)
+        for i in range(0, len(profile_ids), BATCH_SIZE):
+            queryset = DailyAggregate.objects.filter(profile_id__in=profile_ids[i:i + BATCH_SIZE])
+            for day, ice_amount in queryset.values_list('day', 'ice_amount'):
+                self.__daily[day] -= ice_amount
+                if day == 1:
+                    self.__profiles_num -= 1
+
+            queryset.delete()
+
+
+    def finish(self):
+        self.__flush()
+        DailyAggregate.objects.filter(profile_id=None).delete()
+        if self.__profiles_num:
+            daily = self.__daily
+            total = sum(daily)
+            insert_aggregates([(None, day, daily[day], daily[day] * ICE_UNIT_COST) for day in range(1, AGGREGATE_DAYS + 1)] +
+                              [(None, None, total, total * ICE_UNIT_COST)])
+
+
+# Takes (profile_id, heights) pairs, profiles are read from the database if none given
+def rebuild_aggregates(profiles=None):
+    if profiles is None:
+        profiles = WallProfile.objects.values_list('id', 'initial_heights').iterator()
+
+    writer = AggregatesWriter()
+    for profile_id, heights in profiles:
+        writer.add(profile_id, heights)
+
+    writer.finish()
+
+
+# Profile id None stands for all profiles, day None for the whole construction.
+# Raises DailyAggregate.DoesNotExist if there is no such profile.
+def get_aggregate(profile_id, day):
+    if day is None:
+        return DailyAggregate.objects.get(profile_id=profile_id, day=None)
+
+    # A missing profile is looked up first, whatever the day
+    aggregate = DailyAggregate.objects.get(profile_id=profile_id, day=min(max(day, 1), AGGREGATE_DAYS))
+    assert day > 0
+    if day > AGGREGATE_DAYS:
+        aggregate.ice_amount = aggregate.cost = 0
+
+    return aggregate
@@ -0,0 +1,57 @@
+import pytest
+
+from django.core.management import call_command
+
+from wall_tracker.models import WallProfile, DailyAggregate
+from wall_tracker.aggregates import get_aggregate, AGGREGATE_DAYS
+from wall_tracker.histogram import make_histogram, merge_histograms, get_daily_volume, get_daily_cost, get_total_cost
+
+
+PROFILES = [[21, 25, 28], [17], [17, 22, 17, 19, 17]]
+
+
+@pytest.fixture(autouse=True)
+def dataset_files(settings, tmp_path):
+    settings.WALL_TRACKER_DATASET_VERSION_FILE = tmp_path / 'dataset.version'
+    settings.WALL_TRACKER_PROFILE_STORE_FILE = tmp_path / 'profiles.bin'
+
+
+@pytest.fixture
+def profiles_file(tmp_path):
+    fn = tmp_path / 'profiles.txt'
+    fn.write_text('\n'.join(' '.join(str(h) for h in p) for p in PROFILES))
+    return fn
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+def test_import_must_fill_aggregates(profiles_file):
+    call_command('import_profile', str(profiles_file))
+
+    assert WallProfile.objects.count() == len(PROFILES)
+    total = merge_histograms(make_histogram(p) for p in PROFILES)
+    for day in range(1, AGGREGATE_DAYS + 5):
+        for profile_id, heights in enumerate(PROFILES, 1):
+            aggregate = get_aggregate(profile_id, day)
+            assert aggregate.ice_amount == get_daily_volume(day, make_histogram(heights))
+            assert aggregate.cost == get_daily_cost(day, make_histogram(heights))
+
+        assert get_aggregate(None, day).cost == get_daily_cost(day, total)
+
+    assert get_aggregate(None, None).cost == get_total_cost(total)
+
+    with pytest.raises(DailyAggregate.DoesNotExist):
+        get_aggregate(len(PROFILES) + 1, 1)
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+def test_import_must_keep_data_on_invalid_profile(profiles_file, tmp_path):
+    call_command('import_profile', str(profiles_file))
+    aggregates_num = DailyAggregate.objects.count()
+
+    invalid_file = tmp_path / 'invalid.txt'
+    invalid_file.write_text('1 2 3\n1 31 2\n')
+    with pytest.raises(ValueError):
+        call_command('import_profile', str(invalid_file))
+
+    assert WallProfile.objects.count() == len(PROFILES)
+    assert DailyAggregate.objects.count() == aggregates_num
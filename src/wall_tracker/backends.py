@@ -0,0 +1,170 @@
+from django.conf import settings
+from django.db import connection
+
+from wall_tracker.models import WallProfile, MIN_WALL_HEIGHT
+from wall_tracker.aggregates import get_aggregate
+from wall_tracker.histogram import (ICE_VOLUME_PER_DAY, HISTOGRAM_SIZE, make_histogram, merge_histograms,
+                                    get_daily_volume, get_total_volume)
+from wall_tracker.vectorized import (pack_heights, get_daily_sections, get_day_column, 
+                                     count_daily_sections, count_total_sections)
+from wall_tracker.read_model import get_snapshot
+from wall_tracker.store import get_profile_store
+
+
+# Backends compute ice amounts for the wall_tracker views. Each of them raises
+# django.core.exceptions.ObjectDoesNotExist subclass if there is no profile asked for.
+
+
+class HistogramBackend:
+    def __histograms(self, queryset):
+        hists = [make_histogram(heights) for heights in queryset.values_list('initial_heights', flat=True)]
+        if not hists:
+            raise WallProfile.DoesNotExist
+
+        return hists
+
+
+    def profile_daily_volume(self, profile_id, day):
+        hist, = self.__histograms(WallProfile.objects.filter(id=profile_id))
+        return get_daily_volume(day, hist)
+
+
+    def all_profiles_daily_volume(self, day):
+        return get_daily_volume(day, merge_histograms(self.__histograms(WallProfile.objects.all())))
+
+
+    def total_volume(self):
+        return get_total_volume(merge_histograms(self.__histograms(WallProfile.objects.all())))
+
+
+class AggregatesBackend:
+    def profile_daily_volume(self, profile_id, day):
+        return get_aggregate(profile_id, day).ice_amount
+
+
+    def all_profiles_daily_volume(self, day):
+        return get_aggregate(None, day).ice_amount
+
+
+    def total_volume(self):
+        return get_aggregate(None, None).ice_amount
+
+
+class NumpyBackend:
+    def __daily_sections(self, queryset):
+        heights, offsets = pack_heights(queryset.values_list('initial_heights', flat=True))
+        if len(offsets) == 1:
+            raise WallProfile.DoesNotExist
+
+        return get_daily_sections(heights, offsets)
+
+
+    def profile_daily_volume(self, profile_id, day):
+        daily_sections = self.__daily_sections(WallProfile.objects.filter(id=profile_id))
+        return int(get_day_column(daily_sections, day)[0]) * ICE_VOLUME_PER_DAY
+
+
+    def all_profiles_daily_volume(self, day):
+        daily_sections = self.__daily_sections(WallProfile.objects.all())
+        return int(get_day_column(daily_sections, day).sum()) * ICE_VOLUME_PER_DAY
+
+
+    def total_volume(self):
+        return int(self.__daily_sections(WallProfile.objects.all()).sum()) * ICE_VOLUME_PER_DAY
+
+
+class SqlBackend:
+    # Heights are counted inside SQLite walking the byte positions of the heights blobs with a recursive CTE,
+    # so only the histogram crosses the DB boundary. Profiles without sections still yield a row with NULL 
+    # height to tell them from missing ones.
+    HISTOGRAM_QUERY = (
+        f'WITH RECURSIVE pos(i) AS ('
+        f'SELECT 1 UNION ALL SELECT i + 1 FROM pos '
+        f'WHERE i < (SELECT MAX(length(p.initial_heights)) FROM {WallProfile._meta.db_table} AS p {{where}})) '
+        f'SELECT substr(p.initial_heights, pos.i, 1) AS h, COUNT(pos.i) FROM {WallProfile._meta.db_table} AS p '
+        f'LEFT JOIN pos ON pos.i <= length(p.initial_heights) {{where}} GROUP BY h')
+
+    def __histogram(self, profile_id=None):
+        query, params = self.HISTOGRAM_QUERY.format(where=''), []
+        if profile_id is not None:
+            query, params = self.HISTOGRAM_QUERY.format(where='WHERE p.id = %s'), [profile_id, profile_id]
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+        if not rows:
+            raise WallProfile.DoesNotExist
+
+        hist = [0] * HISTOGRAM_SIZE
+        for h, count in rows:
+            if h is not None:
+                hist[h[0] - MIN_WALL_HEIGHT] = count
+
+        return hist
+
+
+    def profile_daily_volume(self, profile_id, day):
+        return get_daily_volume(day, self.__histogram(profile_id))
+
+
+    def all_profiles_daily_volume(self, day):
+        return get_daily_volume(day, self.__histogram())
+
+
+    def total_volume(self):
+        return get_total_volume(self.__histogram())
+
+
+class ReadModelBackend:
+    def profile_daily_volume(self, profile_id, day):
+        return get_snapshot().profile_daily_volume(profile_id, day)
+
+
+    def all_profiles_daily_volume(self, day):
+        return get_snapshot().all_profiles_daily_volume(day)
+
+
+    def total_volume(self):
+        return get_snapshot().total_volume()
+
+
+class ProfileStoreBackend:
+    def __heights(self, profile_id=None):
+        store = get_profile_store()
+        if profile_id is None:
+            if not store.profiles_num():
+                raise WallProfile.DoesNotExist
+
+            return store.heights()
+
+        try:
+            return store.heights(profile_id)
+        except KeyError:
+            raise WallProfile.DoesNotExist
+
+
+    def profile_daily_volume(self, profile_id, day):
+        return count_daily_sections(self.__heights(profile_id), day) * ICE_VOLUME_PER_DAY
+
+
+    def all_profiles_daily_volume(self, day):
+        return count_daily_sections(self.__heights(), day) * ICE_VOLUME_PER_DAY
+
+
+    def total_volume(self):
+        return count_total_sections(self.__heights()) * ICE_VOLUME_PER_DAY
+
+
+BACKENDS = {
+    'histogram': HistogramBackend,
+    'aggregates': AggregatesBackend,
+    'numpy': NumpyBackend,
+    'sql': SqlBackend,
+    'memory': ReadModelBackend,
+    'mmap': ProfileStoreBackend,
+}
+
+
+def get_backend():
+    return BACKENDS[settings.WALL_TRACKER_BACKEND]()
@@ -0,0 +1,137 @@
+import pytest
+import random
+import time
+
+import numpy as np
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from wall_tracker.models import WallProfile, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker.aggregates import rebuild_aggregates
+from wall_tracker.dataset import bump_dataset_version
+from wall_tracker.store import write_profile_store
+from wall_tracker.backends import BACKENDS
+from wall_tracker.histogram import ICE_VOLUME_PER_DAY, make_histogram, merge_histograms, get_daily_volume, get_total_volume
+from wall_tracker.vectorized import pack_heights, get_daily_sections, get_day_column
+
+
+# The way volumes were computed before the engines were introduced
+def loop_daily_volume(day, heights):
+    return sum(ICE_VOLUME_PER_DAY for h in heights if (MAX_WALL_HEIGHT - (h + day)) >= 0)
+
+
+def loop_all_profiles_daily_volume(day, profiles):
+    return sum(loop_daily_volume(day, heights) for heights in profiles)
+
+
+def loop_total_volume(profiles):
+    return sum(loop_daily_volume(day, heights) for heights in profiles for day in range(1, 31))
+
+
+def random_profiles(profiles_num, max_sections_num):
+    return [[random.randint(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT) for _ in range(random.randint(1, max_sections_num))]
+            for _ in range(profiles_num)]
+
+
+@pytest.fixture(autouse=True)
+def dataset_files(settings, tmp_path):
+    settings.WALL_TRACKER_DATASET_VERSION_FILE = tmp_path / 'dataset.version'
+    settings.WALL_TRACKER_PROFILE_STORE_FILE = tmp_path / 'profiles.bin'
+
+
+@pytest.fixture
+def profiles(settings):
+    profiles = random_profiles(10, 300)
+    WallProfile.objects.all().delete()
+    for profile_id, heights in enumerate(profiles, 1):
+        WallProfile.objects.create(id=profile_id, initial_heights=heights)
+
+    rebuild_aggregates()
+    write_profile_store(settings.WALL_TRACKER_PROFILE_STORE_FILE, enumerate(profiles, 1))
+    bump_dataset_version()
+    return profiles
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+@pytest.mark.parametrize('backend', BACKENDS.keys())
+def test_backend_must_match_loop(profiles, backend):
+    sut = BACKENDS[backend]()
+    for day in range(1, MAX_WALL_HEIGHT + 3):
+        for profile_id, heights in enumerate(profiles, 1):
+            assert sut.profile_daily_volume(profile_id, day) == loop_daily_volume(day, heights)
+
+        assert sut.all_profiles_daily_volume(day) == loop_all_profiles_daily_volume(day, profiles)
+
+    assert sut.total_volume() == loop_total_volume(profiles)
+
+    with pytest.raises(ObjectDoesNotExist):
+        sut.profile_daily_volume(len(profiles) + 1, 1)
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+@pytest.mark.parametrize('backend', BACKENDS.keys())
+def test_backend_must_raise_if_no_profiles(backend):
+    WallProfile.objects.all().delete()
+    rebuild_aggregates()
+    bump_dataset_version()
+    sut = BACKENDS[backend]()
+
+    with pytest.raises(ObjectDoesNotExist):
+        sut.all_profiles_daily_volume(1)
+
+    with pytest.raises(ObjectDoesNotExist):
+        sut.total_volume()
+
+
+def test_pack_heights():
+    heights, offsets = pack_heights([[1, 2, 3], [4], [5, 6]])
+    assert heights.dtype == np.uint8
+    assert list(heights) == [1, 2, 3, 4, 5, 6]
+    assert list(offsets) == [0, 3, 4, 6]
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def numpy_all_profiles_daily_volume(day, profiles):
+    heights, offsets = pack_heights(profiles)
+    return int(get_day_column(get_daily_sections(heights, offsets), day).sum()) * ICE_VOLUME_PER_DAY
+
+
+def numpy_total_volume(profiles):
+    heights, offsets = pack_heights(profiles)
+    return int(get_daily_sections(heights, offsets).sum()) * ICE_VOLUME_PER_DAY
+
+
+def histogram_all_profiles_daily_volume(day, profiles):
+    return get_daily_volume(day, merge_histograms(make_histogram(heights) for heights in profiles))
+
+
+def histogram_total_volume(profiles):
+    return get_total_volume(merge_histograms(make_histogram(heights) for heights in profiles))
+
+
+PROFILES_NUM = 100
+@pytest.mark.benchmark
+@pytest.mark.parametrize('sections_num', [10_000, 1_000_000, 10_000_000])
+def test_benchmark_all_profiles_engines(sections_num):
+    rng = np.random.default_rng()
+    profiles = [a.tolist() for a in np.array_split(rng.integers(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT + 1, sections_num), PROFILES_NUM)]
+
+    day = 5
+    expected_daily, loop_daily = measure(loop_all_profiles_daily_volume, day, profiles)
+    expected_total, loop_total = measure(loop_total_volume, profiles)
+    print(f'\nTOTAL SECTIONS: {sections_num}, PROFILES: {PROFILES_NUM}')
+    print(f'loop: daily {loop_daily:.4f}s, total {loop_total:.4f}s')
+
+    for name, daily_func, total_func in [('histogram', histogram_all_profiles_daily_volume, histogram_total_volume),
+                                         ('numpy', numpy_all_profiles_daily_volume, numpy_total_volume)]:
+        daily, daily_time = measure(daily_func, day, profiles)
+        total, total_time = measure(total_func, profiles)
+        assert daily == expected_daily
+        assert total == expected_total
+        print(f'{name}: daily {daily_time:.4f}s ({loop_daily / daily_time:.1f}x), '
+              f'total {total_time:.4f}s ({loop_total / total_time:.1f}x)')
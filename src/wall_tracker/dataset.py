@@ -0,0 +1,52 @@
+from django.conf import settings
+
+import os
+import uuid
+
+
+# The dataset version stamp is a small file rewritten by import_profile. Server processes compare
+# its first line with the version of the data they serve and reload the data if it differs.
+# An incremental import also records the version it was applied to and the ids of the profiles 
+# it has changed, so the data of that version can be refreshed for these profiles only:
+#   <version>
+#   <base version>
+#   <changed profile ids>
+
+
+def read_dataset_version():
+    try:
+        with open(settings.WALL_TRACKER_DATASET_VERSION_FILE) as f:
+            return f.readline().rstrip('\n')
+    except FileNotFoundError:
+        return None
+
+
+# Returns (version, base version, changed profile ids), the latter two are None if all profiles
+# may have changed
+def read_dataset_changes():
+    try:
+        with open(settings.WALL_TRACKER_DATASET_VERSION_FILE) as f:
+            version = f.readline().rstrip('\n')
+            base_version = f.readline().rstrip('\n')
+            changed_ids = f.readline().split()
+    except FileNotFoundError:
+        return None, None, None
+
+    if not base_version:
+        return version, None, None
+
+    return version, base_version, set(int(profile_id) for profile_id in changed_ids)
+
+
+def bump_dataset_version(changed_ids=None):
+    fn = settings.WALL_TRACKER_DATASET_VERSION_FILE
+    base_version = read_dataset_version() if changed_ids is not None else None
+    tmp_fn = f'{fn}.{os.getpid()}.tmp'
+    with open(tmp_fn, 'w') as f:
+        f.write(f'{uuid.uuid4().hex}\n')
+        if base_version is not None:
+            f.write(f'{base_version}\n')
+            f.write(' '.join(str(profile_id) for profile_id in sorted(changed_ids)))
+            f.write('\n')
+
+    os.replace(tmp_fn, fn)
@@ -0,0 +1,55 @@
+from wall_tracker.models import MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+
+from collections import Counter
+
+
+ICE_VOLUME_PER_DAY = 195
+ICE_UNIT_COST = 1900
+
+# One bin per possible section height, MIN_WALL_HEIGHT..MAX_WALL_HEIGHT inclusive
+HISTOGRAM_SIZE = MAX_WALL_HEIGHT - MIN_WALL_HEIGHT + 1
+# No section is in work after this day
+MAX_BUILD_DAYS = MAX_WALL_HEIGHT - MIN_WALL_HEIGHT
+
+
+def make_histogram(heights):
+    counts = Counter(heights)
+    return [counts[h] for h in range(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT + 1)]
+
+
+def merge_histograms(histograms):
+    total = [0] * HISTOGRAM_SIZE
+    for hist in histograms:
+        for i, count in enumerate(hist):
+            total[i] += count
+
+    return total
+
+
+def get_daily_sections(day, histogram):
+    # A section of height h is being built on days 1..(MAX_WALL_HEIGHT - h),
+    # so on the given day the sections in work are those with h <= MAX_WALL_HEIGHT - day
+    assert day > 0
+    top = MAX_WALL_HEIGHT - day
+    if top < MIN_WALL_HEIGHT:
+        return 0
+
+    return sum(histogram[:top - MIN_WALL_HEIGHT + 1])
+
+
+def get_daily_volume(day, histogram):
+    return get_daily_sections(day, histogram) * ICE_VOLUME_PER_DAY
+
+
+def get_daily_cost(day, histogram):
+    return get_daily_volume(day, histogram) * ICE_UNIT_COST
+
+
+def get_total_volume(histogram):
+    # Each section takes one day per missing foot
+    return sum((MAX_WALL_HEIGHT - h) * count
+               for h, count in enumerate(histogram, MIN_WALL_HEIGHT)) * ICE_VOLUME_PER_DAY
+
+
+def get_total_cost(histogram):
+    return get_total_volume(histogram) * ICE_UNIT_COST
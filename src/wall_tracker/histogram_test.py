@@ -0,0 +1,45 @@
+import pytest
+import random
+
+from wall_tracker.models import MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker.histogram import (ICE_VOLUME_PER_DAY, ICE_UNIT_COST, HISTOGRAM_SIZE, make_histogram,
+                                    merge_histograms, get_daily_volume, get_daily_cost, get_total_cost)
+
+
+def brute_force_daily_volume(day, heights):
+    return sum(ICE_VOLUME_PER_DAY for h in heights if (MAX_WALL_HEIGHT - (h + day)) >= 0)
+
+
+@pytest.fixture
+def heights():
+    return [random.randint(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT) for _ in range(random.randint(1, 1000))]
+
+
+def test_histogram():
+    hist = make_histogram([0, 30, 17, 17])
+    assert len(hist) == HISTOGRAM_SIZE
+    assert hist[0] == 1
+    assert hist[17] == 2
+    assert hist[30] == 1
+    assert sum(hist) == 4
+    assert make_histogram([]) == [0] * HISTOGRAM_SIZE
+    assert merge_histograms([make_histogram([1, 2]), make_histogram([2])]) == make_histogram([1, 2, 2])
+
+
+@pytest.mark.parametrize('iter', range(10))
+def test_daily_volume_and_cost_must_match_brute_force(heights, iter):
+    hist = make_histogram(heights)
+    for day in range(1, MAX_WALL_HEIGHT + 5):
+        assert get_daily_volume(day, hist) == brute_force_daily_volume(day, heights)
+        assert get_daily_cost(day, hist) == brute_force_daily_volume(day, heights) * ICE_UNIT_COST
+
+
+@pytest.mark.parametrize('iter', range(10))
+def test_total_cost_must_match_brute_force(heights, iter):
+    expected = sum(brute_force_daily_volume(day, heights) * ICE_UNIT_COST for day in range(1, 31))
+    assert get_total_cost(make_histogram(heights)) == expected
+
+
+def test_daily_volume_must_reject_non_positive_day():
+    with pytest.raises(AssertionError):
+        get_daily_volume(0, make_histogram([1]))
@@ -0,0 +1,198 @@
+from django.conf import settings
+from django.db import transaction
+
+from wall_tracker.models import WallProfile, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT, heights_hash
+from wall_tracker.aggregates import AggregatesWriter
+from wall_tracker.dataset import bump_dataset_version
+from wall_tracker.store import ProfileStoreWriter
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque, namedtuple
+import os
+
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+# changed_ids is the set of inserted, updated and deleted profile ids, None for a full import
+ImportResult = namedtuple('ImportResult', ['profiles_num', 'sections_num', 'changed_ids'])
+
+
+class InvalidProfileError(ValueError):
+    def __init__(self, profile_id):
+        super().__init__(f'Invalid height value given, profile id: [{profile_id}]')
+        self.profile_id = profile_id
+
+
+def parse_heights(line, profile_id):
+    try:
+        # bytes() rejects anything out of 0..255 range, the rest is checked per batch
+        return bytes(map(int, line.split()))
+    except ValueError:
+        raise InvalidProfileError(profile_id)
+
+
+# Yields (profile_id, heights) pairs reading the file line by line, blank lines are skipped
+def parse_profiles(f):
+    profile_id = 0
+    for line in f:
+        if line.strip():
+            profile_id += 1
+            yield profile_id, parse_heights(line, profile_id)
+
+
+# Splits the file into (start, end) byte ranges of about chunk_size bytes each starting at a line start
+def split_file(path, chunk_size):
+    size = os.path.getsize(path)
+    ranges = list()
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            # Stepping one byte back keeps a line that starts right at the boundary for the next range
+            f.seek(min(start + chunk_size, size) - 1)
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+
+# Runs in a pool process. Returns heights of the profiles of the range and the index of the first invalid
+# one within the range if any, the profile ids are only known to the caller.
+def parse_chunk(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).splitlines()
+
+    profiles = list()
+    invalid = None
+    for line in lines:
+        if line.strip():
+            try:
+                profiles.append(bytes(map(int, line.split())))
+            except ValueError:
+                invalid = len(profiles)
+                break
+
+    # Out of range heights before the unparsable line go first
+    heights = np.frombuffer(b''.join(profiles), dtype=np.uint8)
+    out_of_range = np.flatnonzero((heights < MIN_WALL_HEIGHT) | (heights > MAX_WALL_HEIGHT))
+    if len(out_of_range):
+        offsets = np.cumsum([len(p) for p in profiles])
+        invalid = int(np.searchsorted(offsets, out_of_range[0], side='right'))
+
+    return profiles, invalid
+
+
+# Same as parse_profiles but parses byte ranges of the file in a pool of processes. Ranges are
+# yielded in file order, with at most two ranges per process parsed ahead to keep memory bounded.
+def parse_profiles_parallel(path, jobs, chunk_size=None):
+    if chunk_size is None:
+        # A few ranges per process to even out the load
+        chunk_size = max(1, min(MAX_CHUNK_SIZE, os.path.getsize(path) // (4 * jobs)))
+
+    ranges = deque(split_file(path, chunk_size))
+    profile_id = 0
+    with ProcessPoolExecutor(jobs) as executor:
+        pending = deque()
+        while ranges or pending:
+            while ranges and len(pending) < 2 * jobs:
+                pending.append(executor.submit(parse_chunk, path, *ranges.popleft()))
+
+            profiles, invalid = pending.popleft().result()
+            if invalid is not None:
+                for future in pending:
+                    future.cancel()
+
+                raise InvalidProfileError(profile_id + invalid + 1)
+
+            for heights in profiles:
+                profile_id += 1
+                yield profile_id, heights
+
+
+def validate_batch(batch):
+    heights = np.frombuffer(b''.join(heights for _, heights in batch), dtype=np.uint8)
+    invalid = np.flatnonzero((heights < MIN_WALL_HEIGHT) | (heights > MAX_WALL_HEIGHT))
+    if len(invalid):
+        offsets = np.cumsum([len(heights) for _, heights in batch])
+        profile_id, _ = batch[int(np.searchsorted(offsets, invalid[0], side='right'))]
+        raise InvalidProfileError(profile_id)
+
+
+def batched(profiles, batch_size):
+    batch = list()
+    for profile in profiles:
+        batch.append(profile)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = list()
+
+    if batch:
+        yield batch
+
+
+# Replaces all the profiles with the (profile_id, heights) pairs given in one transaction,
+# profile ids must ascend. Derived data (aggregates, profile store, dataset version) is published
+# with the same transaction. Only one batch of profiles is held in memory at a time.
+# An incremental import compares content hashes with the stored profiles and only writes the rows 
+# of the profiles inserted, updated or deleted, the ids of which are published with the dataset version.
+def import_profiles(profiles, batch_size=DEFAULT_BATCH_SIZE, progress=None, incremental=False):
+    store = ProfileStoreWriter(settings.WALL_TRACKER_PROFILE_STORE_FILE)
+    profiles_num = sections_num = 0
+    changed_ids = set() if incremental else None
+    try:
+        with transaction.atomic():
+            if incremental:
+                stored = dict(WallProfile.objects.values_list('id', 'content_hash').iterator())
+            else:
+                WallProfile.objects.all().delete()
+
+            aggregates = AggregatesWriter(replace=not incremental)
+            for batch in batched(profiles, batch_size):
+                validate_batch(batch)
+                rows = [WallProfile(id=profile_id, initial_heights=heights, content_hash=heights_hash(heights))
+                        for profile_id, heights in batch]
+                if incremental:
+                    new = [row for row in rows if row.id not in stored]
+                    updated = [row for row in rows if stored.pop(row.id, row.content_hash) != row.content_hash]
+                    aggregates.remove([row.id for row in updated])
+                    WallProfile.objects.bulk_update(updated, ['initial_heights', 'content_hash'])
+                    changed_ids.update(row.id for row in new)
+                    changed_ids.update(row.id for row in updated)
+                else:
+                    new, updated = rows, []
+
+                WallProfile.objects.bulk_create(new)
+                for row in new + updated:
+                    aggregates.add(row.id, row.initial_heights)
+
+                for profile_id, heights in batch:
+                    store.add(profile_id, heights)
+                    sections_num += len(heights)
+
+                profiles_num += len(batch)
+                if progress is not None:
+                    progress(profiles_num, sections_num)
+
+            if incremental:
+                # The profiles left have not been found in the input
+                deleted_ids = sorted(stored)
+                aggregates.remove(deleted_ids)
+                for i in range(0, len(deleted_ids), batch_size):
+                    WallProfile.objects.filter(id__in=deleted_ids[i:i + batch_size]).delete()
+
+                changed_ids.update(deleted_ids)
+
+            aggregates.finish()
+            # The store is published before the version is bumped, so readers of the new version see it
+            transaction.on_commit(store.commit)
+            transaction.on_commit(lambda: bump_dataset_version(changed_ids))
+    except BaseException:
+        store.abort()
+        raise
+
+    return ImportResult(profiles_num, sections_num, changed_ids)
@@ -0,0 +1,176 @@
+import pytest
+import io
+import random
+import time
+
+from django.core.management import call_command
+
+from wall_tracker.models import WallProfile, DailyAggregate, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker.aggregates import rebuild_aggregates
+from wall_tracker.dataset import read_dataset_changes
+from wall_tracker.store import ProfileStore
+from wall_tracker import importer
+from wall_tracker.importer import (import_profiles, parse_profiles, parse_profiles_parallel, split_file, 
+                                   InvalidProfileError)
+
+
+@pytest.fixture(autouse=True)
+def dataset_files(settings, tmp_path):
+    settings.WALL_TRACKER_DATASET_VERSION_FILE = tmp_path / 'dataset.version'
+    settings.WALL_TRACKER_PROFILE_STORE_FILE = tmp_path / 'profiles.bin'
+
+
+def random_profiles(profiles_num, max_sections_num):
+    return [[random.randint(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT) for _ in range(random.randint(1, max_sections_num))]
+            for _ in range(profiles_num)]
+
+
+def write_profiles(fn, profiles):
+    with open(fn, 'w') as f:
+        for p in profiles:
+            f.write(' '.join(str(h) for h in p))
+            f.write('\n')
+
+
+def test_parse_profiles_must_skip_blank_lines():
+    f = io.StringIO('1 2 3\n\n  \n30\n0 0\n')
+    assert list(parse_profiles(f)) == [(1, bytes([1, 2, 3])), (2, bytes([30])), (3, bytes([0, 0]))]
+
+
+@pytest.mark.parametrize('text, profile_id', [('1 2\n-1\n', 2), ('1 2\n3 x\n', 2), ('1 2\n3 256\n', 2)])
+def test_parse_profiles_must_reject_invalid_values(text, profile_id):
+    with pytest.raises(InvalidProfileError) as e:
+        list(parse_profiles(io.StringIO(text)))
+
+    assert e.value.profile_id == profile_id
+
+
+def test_split_file_must_align_ranges_to_lines(tmp_path):
+    fn = tmp_path / 'profiles.txt'
+    fn.write_bytes(b'1 2 3\n4 5\n\n6\n7 8 9 10')
+
+    ranges = split_file(fn, 3)
+    assert ranges == [(0, 6), (6, 10), (10, 13), (13, 21)]
+    data = fn.read_bytes()
+    assert b''.join(data[start:end] for start, end in ranges) == data
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 1024 * 1024])
+def test_parallel_parsing_must_match_sequential(tmp_path, chunk_size):
+    fn = tmp_path / 'profiles.txt'
+    profiles = random_profiles(50, 40)
+    text = '\n'.join(' '.join(str(h) for h in p) + ('\n  ' if i % 7 == 0 else '') for i, p in enumerate(profiles))
+    fn.write_text(text)
+
+    with open(fn) as f:
+        expected = list(parse_profiles(f))
+
+    assert list(parse_profiles_parallel(fn, 3, chunk_size)) == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 1024])
+@pytest.mark.parametrize('text, profile_id', [('1 2\n\n3\n31 1\n4 x\n', 3), ('1 2\n3\n4 x\n31\n', 3), ('1\n2\n3 -1', 3)])
+def test_parallel_parsing_must_report_first_invalid_profile(tmp_path, chunk_size, text, profile_id):
+    fn = tmp_path / 'profiles.txt'
+    fn.write_text(text)
+
+    with pytest.raises(InvalidProfileError) as e:
+        list(parse_profiles_parallel(fn, 2, chunk_size))
+
+    assert e.value.profile_id == profile_id
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+@pytest.mark.parametrize('batch_size', [1, 3, 1000])
+def test_import_must_store_all_profiles(batch_size):
+    profiles = random_profiles(10, 50)
+    progress = list()
+
+    result = import_profiles(((i, bytes(p)) for i, p in enumerate(profiles, 1)), batch_size, 
+                             lambda *args: progress.append(args))
+
+    assert result == (len(profiles), sum(len(p) for p in profiles), None)
+    assert progress[-1] == result[:2]
+    assert len(progress) == (len(profiles) + batch_size - 1) // batch_size
+    assert [list(h) for h in WallProfile.objects.order_by('id').values_list('initial_heights', flat=True)] == profiles
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+def test_import_must_report_invalid_profile_and_keep_data(tmp_path):
+    fn = tmp_path / 'profiles.txt'
+    write_profiles(fn, [[1], [2]])
+    call_command('import_profile', str(fn), verbosity=0)
+    aggregates_num = DailyAggregate.objects.count()
+
+    write_profiles(fn, [[1], [2], [3, 31], [4]])
+    with pytest.raises(InvalidProfileError) as e:
+        call_command('import_profile', str(fn), '--batch-size', '10', verbosity=0)
+
+    assert e.value.profile_id == 3
+    assert WallProfile.objects.count() == 2
+    assert DailyAggregate.objects.count() == aggregates_num
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'], transaction=True)
+def test_error_after_store_commit_must_not_be_hidden(monkeypatch, settings):
+    def failing_bump(changed_ids):
+        raise OSError('Version stamp not written')
+
+    monkeypatch.setattr(importer, 'bump_dataset_version', failing_bump)
+    with pytest.raises(OSError, match='Version stamp not written'):
+        import_profiles([(1, bytes([1, 2])), (2, bytes([3]))])
+
+    # The store published before the error stays
+    assert ProfileStore(settings.WALL_TRACKER_PROFILE_STORE_FILE).profiles_num() == 2
+
+
+def aggregates_table():
+    return sorted(DailyAggregate.objects.values_list('profile_id', 'day', 'ice_amount', 'cost'), key=str)
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+@pytest.mark.parametrize('batch_size', [1, 2, 1000])
+def test_incremental_import_must_only_write_changed_profiles(batch_size, django_capture_on_commit_callbacks):
+    profiles = random_profiles(6, 20)
+    with django_capture_on_commit_callbacks(execute=True):
+        import_profiles((i, bytes(p)) for i, p in enumerate(profiles, 1))
+
+    unchanged_pks = set(DailyAggregate.objects.filter(profile_id__in=[1, 3, 5]).values_list('pk', flat=True))
+    version = read_dataset_changes()[0]
+
+    # Profile 2 changed, 4 unchanged but 6 deleted, 7 added
+    profiles[1] = [(h + 1) % (MAX_WALL_HEIGHT + 1) for h in profiles[1]]
+    new_profiles = [(i, bytes(p)) for i, p in enumerate(profiles[:5], 1)] + [(7, bytes([0, 30]))]
+    with django_capture_on_commit_callbacks(execute=True):
+        result = import_profiles(new_profiles, batch_size, incremental=True)
+
+    assert result == (6, sum(len(p) for _, p in new_profiles), {2, 6, 7})
+    assert read_dataset_changes() == (read_dataset_changes()[0], version, {2, 6, 7})
+    assert list(WallProfile.objects.order_by('id').values_list('id', 'initial_heights')) == new_profiles
+    # Aggregates of the unchanged profiles are not rewritten
+    assert unchanged_pks <= set(DailyAggregate.objects.values_list('pk', flat=True))
+
+    aggregates = aggregates_table()
+    rebuild_aggregates()
+    assert aggregates == aggregates_table()
+
+    result = import_profiles(new_profiles, incremental=True)
+    assert result.changed_ids == set()
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db(databases=['TEST', 'default'])
+@pytest.mark.parametrize('jobs', [1, 4])
+@pytest.mark.parametrize('profiles_num, sections_num', [(10_000, 100), (100, 10_000), (10, 100_000), (10, 1_000_000)])
+def test_benchmark_import_throughput(tmp_path, profiles_num, sections_num, jobs):
+    fn = tmp_path / 'profiles.txt'
+    write_profiles(fn, [[random.randint(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT) for _ in range(sections_num)] 
+                        for _ in range(profiles_num)])
+
+    start = time.perf_counter()
+    call_command('import_profile', str(fn), '--jobs', str(jobs), verbosity=0)
+    elapsed = time.perf_counter() - start
+
+    total = profiles_num * sections_num
+    print(f'\nPROFILES: {profiles_num}, SECTIONS PER PROFILE: {sections_num}, JOBS: {jobs}, '
+          f'time: {elapsed:.3f}s, {profiles_num / elapsed:.0f} profiles/s, {total / elapsed:.0f} sections/s')
@@ -1,23 +1,38 @@
 from django.core.management.base import BaseCommand
-from wall_tracker.models import WallProfile, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker.importer import import_profiles, parse_profiles, parse_profiles_parallel, DEFAULT_BATCH_SIZE
 
 
 class Command(BaseCommand):
-    help = 'Add wall profile data to the database. Please note existing data will be overwritten.'
+    help = ('Add wall profile data to the database. Please note existing data will be overwritten, '
+            'with --incremental only the profiles that differ are.')
 
     def add_arguments(self, parser):
         parser.add_argument('input_file', type=str)
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, 
+                            help=f'Number of profiles written at once (default: {DEFAULT_BATCH_SIZE})')
+        parser.add_argument('--jobs', type=int, default=1,
+                            help='Number of processes parsing the file (default: 1)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only write the profiles that have been added, changed or removed since the last import')
 
     def handle(self, *args, **options):
         input_file = options['input_file']
+        verbosity = options['verbosity']
 
-        profiles = dict()
-        with open(input_file) as f:
-            profiles = [[int(h) for h in line.strip().split()] for line in f if line.strip()]
+        def progress(profiles_num, sections_num):
+            if verbosity > 0:
+                self.stdout.write(f'Profiles imported: {profiles_num}, sections: {sections_num}')
 
-        WallProfile.objects.all().delete()
-        for profile_id, heights in enumerate(profiles, 1):
-            if any(h < MIN_WALL_HEIGHT or h > MAX_WALL_HEIGHT for h in heights):
-                raise ValueError(f'Invalid height value given, profile id: [{profile_id}]')
+        if options['jobs'] > 1:
+            profiles = parse_profiles_parallel(input_file, options['jobs'])
+            result = import_profiles(profiles, options['batch_size'], progress, options['incremental'])
+        else:
+            with open(input_file) as f:
+                result = import_profiles(parse_profiles(f), options['batch_size'], progress, options['incremental'])
 
-            p = WallProfile.objects.create(id=profile_id, initial_heights=heights)
+        if verbosity > 0:
+            message = f'Import completed, profiles: {result.profiles_num}, sections: {result.sections_num}'
+            if result.changed_ids is not None:
+                message += f', profiles changed: {len(result.changed_ids)}'
+
+            self.stdout.write(self.style.SUCCESS(message))
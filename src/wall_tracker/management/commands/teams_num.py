@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from wall_tracker.models import TeamsNumber
+from wall_tracker.dataset import bump_dataset_version
 
 
 class Command(BaseCommand):
@@ -10,5 +12,8 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         teams_num = options['num']
-        TeamsNumber.objects.all().delete()
-        TeamsNumber.objects.create(teams=teams_num)
+        with transaction.atomic():
+            TeamsNumber.objects.all().delete()
+            TeamsNumber.objects.create(teams=teams_num)
+            # No profile has changed, readers of profiles keep their data
+            transaction.on_commit(lambda: bump_dataset_version(set()))
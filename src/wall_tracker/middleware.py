@@ -1,8 +1,11 @@
-from wall_tracker.stuff import make_response
+from wall_tracker.stuff import make_response, make_503_service_unavailable_response
 from wall_tracker.models import WallProfile
+from wall_tracker.admission import Overloaded, get_executor
 
 from rest_framework import status
 from django.http import JsonResponse
+from django.urls import resolve, Resolver404
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 
 from uuid import uuid4
 import logging
@@ -11,9 +14,15 @@ import logging
 _logger = logging.getLogger(__name__)
 
 
+# Both sync and async capable, so the requests get to AdmissionMiddleware on the event loop under ASGI
 class RequestIdMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
 
     def __call__(self, request, *args, **kwargs):
@@ -23,6 +32,41 @@ class RequestIdMiddleware:
         return response
 
 
+# Admits requests to the sync views through the executor (see admission.Executor), the ones shed get 503.
+# Async only, so the sync middleware and views below run on a thread asgiref hops to after this one:
+# requests wait for a slot on the event loop and no more of them than there are slots are ever handed 
+# to the thread. Async views do their blocking work on the executor themselves.
+class AdmissionMiddleware:
+    sync_capable = False
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        markcoroutinefunction(self)
+
+
+    @staticmethod
+    def is_blocking(request):
+        try:
+            view_class = getattr(resolve(request.path_info).func, 'view_class', None)
+        except Resolver404:
+            return False
+
+        return view_class is not None and not view_class.view_is_async
+
+
+    async def __call__(self, request, *args, **kwargs):
+        if not self.is_blocking(request):
+            return await self.get_response(request)
+
+        try:
+            async with get_executor().async_slot():
+                return await self.get_response(request)
+        except Overloaded as e:
+            _logger.warning(f'Request shed: [{request.id=}; {e}]')
+            return make_503_service_unavailable_response(request.id)
+
+
 class DisallowPostMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
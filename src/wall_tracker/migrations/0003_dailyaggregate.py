@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wall_tracker', '0002_teamsnumber'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile_id', models.PositiveIntegerField(null=True)),
+                ('day', models.PositiveIntegerField(null=True)),
+                ('ice_amount', models.BigIntegerField()),
+                ('cost', models.BigIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profile_id', 'day'), name='unique_profile_day_aggregate')],
+            },
+        ),
+    ]
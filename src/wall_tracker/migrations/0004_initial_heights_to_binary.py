@@ -0,0 +1,50 @@
+# Generated by Django 5.1 on 2026-10-18 08:46
+
+from django.db import migrations, models
+import wall_tracker.models
+
+
+def json_to_binary(apps, schema_editor):
+    WallProfile = apps.get_model('wall_tracker', 'WallProfile')
+    for profile in WallProfile.objects.only('id', 'initial_heights').iterator():
+        profile.heights = bytes(profile.initial_heights)
+        profile.save(update_fields=['heights'])
+
+
+def binary_to_json(apps, schema_editor):
+    WallProfile = apps.get_model('wall_tracker', 'WallProfile')
+    for profile in WallProfile.objects.only('id', 'heights').iterator():
+        profile.initial_heights = list(profile.heights)
+        profile.save(update_fields=['initial_heights'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wall_tracker', '0003_dailyaggregate'),
+    ]
+
+    operations = [
+        # Nullable to let the JSON column be restored and filled in back when migrating backwards
+        migrations.AlterField(
+            model_name='wallprofile',
+            name='initial_heights',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='wallprofile',
+            name='heights',
+            field=wall_tracker.models.HeightsField(default=b''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='wallprofile',
+            name='initial_heights',
+        ),
+        migrations.RenameField(
+            model_name='wallprofile',
+            old_name='heights',
+            new_name='initial_heights',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+import hashlib
+
+
+def fill_content_hash(apps, schema_editor):
+    WallProfile = apps.get_model('wall_tracker', 'WallProfile')
+    for profile in WallProfile.objects.only('id', 'initial_heights').iterator():
+        profile.content_hash = hashlib.blake2b(bytes(profile.initial_heights), digest_size=16).hexdigest()
+        profile.save(update_fields=['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wall_tracker', '0004_initial_heights_to_binary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallprofile',
+            name='content_hash',
+            field=models.CharField(default='', max_length=32),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
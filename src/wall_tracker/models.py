@@ -1,14 +1,50 @@
 from django.db import models
 
+import hashlib
+
 
 MIN_WALL_HEIGHT=0
 MAX_WALL_HEIGHT=30
 
 
+class HeightsField(models.BinaryField):
+    # One byte per section height. Accepts any bytes-like object or iterable of ints, 
+    # values are read back as memoryview
+    def get_prep_value(self, value):
+        if value is not None and not isinstance(value, (bytes, bytearray, memoryview)):
+            value = bytes(value)
+
+        return super().get_prep_value(value)
+
+
+    def from_db_value(self, value, expression, connection):
+        return value if value is None else memoryview(value)
+
+
+def heights_hash(heights):
+    return hashlib.blake2b(bytes(heights), digest_size=16).hexdigest()
+
+
 class WallProfile(models.Model):
     id = models.PositiveIntegerField(primary_key=True)
-    initial_heights = models.JSONField()
+    initial_heights = HeightsField()
+    # heights_hash() of initial_heights set by import_profile, lets incremental imports skip unchanged profiles
+    content_hash = models.CharField(max_length=32, default='')
 
 
 class TeamsNumber(models.Model):
     teams = models.IntegerField()
+
+
+class DailyAggregate(models.Model):
+    # Precomputed ice amount and cost. A NULL profile_id row holds the figures for all profiles,
+    # a NULL day row holds the figures for the whole construction
+    profile_id = models.PositiveIntegerField(null=True)
+    day = models.PositiveIntegerField(null=True)
+    ice_amount = models.BigIntegerField()
+    cost = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile_id', 'day'], name='unique_profile_day_aggregate'),
+        ]
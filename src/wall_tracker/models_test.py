@@ -0,0 +1,48 @@
+import pytest
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+from wall_tracker.models import WallProfile, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+
+
+BEFORE_BINARY = [('wall_tracker', '0003_dailyaggregate')]
+BINARY = [('wall_tracker', '0004_initial_heights_to_binary')]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('heights', [[21, 25, 28], bytes([17, 30]), bytearray([MIN_WALL_HEIGHT, MAX_WALL_HEIGHT]),
+                                     memoryview(bytes([19])), []])
+def test_heights_must_round_trip(heights):
+    WallProfile.objects.create(id=1, initial_heights=heights)
+    profile = WallProfile.objects.get(id=1)
+    assert isinstance(profile.initial_heights, memoryview)
+    assert list(profile.initial_heights) == list(heights)
+
+
+def migrate(targets):
+    executor = MigrationExecutor(connection)
+    executor.loader.build_graph()
+    executor.migrate(targets)
+    return executor.loader.project_state(targets).apps
+
+
+@pytest.mark.django_db(transaction=True)
+def test_heights_must_survive_migration_both_ways():
+    profiles = {1: [21, 25, 28], 2: [17], 3: []}
+    latest = MigrationExecutor(connection).loader.graph.leaf_nodes('wall_tracker')
+    try:
+        apps = migrate(BEFORE_BINARY)
+        for profile_id, heights in profiles.items():
+            apps.get_model('wall_tracker', 'WallProfile').objects.create(id=profile_id, initial_heights=heights)
+
+        apps = migrate(BINARY)
+        rows = apps.get_model('wall_tracker', 'WallProfile').objects.values_list('id', 'initial_heights')
+        assert {profile_id: bytes(heights) for profile_id, heights in rows} == {
+            profile_id: bytes(heights) for profile_id, heights in profiles.items()}
+
+        apps = migrate(BEFORE_BINARY)
+        rows = apps.get_model('wall_tracker', 'WallProfile').objects.values_list('id', 'initial_heights')
+        assert dict(rows) == profiles
+    finally:
+        migrate(latest)
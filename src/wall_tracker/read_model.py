@@ -0,0 +1,118 @@
+from wall_tracker.models import WallProfile
+from wall_tracker.histogram import ICE_VOLUME_PER_DAY, MAX_BUILD_DAYS
+from wall_tracker.vectorized import pack_heights, get_daily_sections
+from wall_tracker.dataset import read_dataset_version, read_dataset_changes
+
+import numpy as np
+import threading
+import logging
+
+
+_logger = logging.getLogger(__name__)
+
+
+REFRESH_BATCH_SIZE = 500
+
+
+def load_daily_sections(queryset):
+    rows = list(queryset.values_list('id', 'initial_heights'))
+    heights, offsets = pack_heights(heights for _, heights in rows)
+    return [profile_id for profile_id, _ in rows], get_daily_sections(heights, offsets)
+
+
+class Snapshot:
+    def __init__(self, version, profile_ids, daily_sections):
+        self.__version = version
+        self.__rows = { profile_id: row for row, profile_id in enumerate(profile_ids) }
+        daily_sections.flags.writeable = False
+        self.__daily_sections = daily_sections
+        self.__all_daily_sections = tuple(int(s) for s in daily_sections.sum(axis=0))
+        self.__total_sections = sum(self.__all_daily_sections)
+
+
+    @classmethod
+    def load(cls, version):
+        return cls(version, *load_daily_sections(WallProfile.objects.order_by('id')))
+
+
+    # Returns a new snapshot with the rows of the profiles given reloaded, 
+    # the ones that no longer exist are dropped
+    def refresh(self, version, changed_ids):
+        rows = self.__rows
+        profile_ids = [profile_id for profile_id in rows if profile_id not in changed_ids]
+        parts = [self.__daily_sections[[rows[profile_id] for profile_id in profile_ids]]]
+        changed_ids = sorted(changed_ids)
+        for i in range(0, len(changed_ids), REFRESH_BATCH_SIZE):
+            ids, daily_sections = load_daily_sections(WallProfile.objects.filter(id__in=changed_ids[i:i + REFRESH_BATCH_SIZE]))
+            profile_ids.extend(ids)
+            parts.append(daily_sections)
+
+        return Snapshot(version, profile_ids, np.concatenate(parts))
+
+
+    def version(self):
+        return self.__version
+
+
+    def profiles_num(self):
+        return len(self.__rows)
+
+
+    def profile_daily_volume(self, profile_id, day):
+        row = self.__rows.get(profile_id)
+        if row is None:
+            raise WallProfile.DoesNotExist
+
+        assert day > 0
+
+        if day > MAX_BUILD_DAYS:
+            return 0
+
+        return int(self.__daily_sections[row, day - 1]) * ICE_VOLUME_PER_DAY
+
+
+    def all_profiles_daily_volume(self, day):
+        if not self.__rows:
+            raise WallProfile.DoesNotExist
+
+        assert day > 0
+
+        if day > MAX_BUILD_DAYS:
+            return 0
+
+        return self.__all_daily_sections[day - 1] * ICE_VOLUME_PER_DAY
+
+
+    def total_volume(self):
+        if not self.__rows:
+            raise WallProfile.DoesNotExist
+
+        return self.__total_sections * ICE_VOLUME_PER_DAY
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_snapshot():
+    global _snapshot
+    version = read_dataset_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version() == version:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        version, base_version, changed_ids = read_dataset_changes()
+        if snapshot is None or snapshot.version() != version:
+            if snapshot is not None and changed_ids is not None and snapshot.version() == base_version:
+                snapshot = snapshot.refresh(version, changed_ids)
+                _logger.info(f'Read model refreshed: [{version=}; profiles changed: {len(changed_ids)}]')
+            else:
+                snapshot = Snapshot.load(version)
+                _logger.info(f'Read model loaded: [{version=}; profiles: {snapshot.profiles_num()}]')
+
+            # Readers holding the previous snapshot keep using it, new ones get the new one
+            _snapshot = snapshot
+
+        return snapshot
@@ -0,0 +1,71 @@
+import pytest
+
+from wall_tracker.models import WallProfile
+from wall_tracker.read_model import get_snapshot
+from wall_tracker.dataset import bump_dataset_version, read_dataset_version
+from wall_tracker.histogram import make_histogram, get_daily_volume
+
+
+@pytest.fixture(autouse=True)
+def dataset_version_file(settings, tmp_path):
+    settings.WALL_TRACKER_DATASET_VERSION_FILE = tmp_path / 'dataset.version'
+
+
+@pytest.fixture
+def profiles():
+    WallProfile.objects.all().delete()
+    WallProfile.objects.create(id=1, initial_heights=[21, 25, 28])
+    WallProfile.objects.create(id=2, initial_heights=[17])
+    bump_dataset_version()
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+def test_snapshot_must_be_served_without_db_queries(profiles, django_assert_num_queries):
+    snapshot = get_snapshot()
+    assert snapshot.version() == read_dataset_version()
+    assert snapshot.profiles_num() == 2
+
+    with django_assert_num_queries(0):
+        assert get_snapshot() is snapshot
+        assert snapshot.profile_daily_volume(1, 3) == get_daily_volume(3, make_histogram([21, 25, 28]))
+        assert snapshot.profile_daily_volume(1, 31) == 0
+        assert snapshot.all_profiles_daily_volume(3) == get_daily_volume(3, make_histogram([21, 25, 28, 17]))
+
+    with pytest.raises(WallProfile.DoesNotExist):
+        snapshot.profile_daily_volume(3, 1)
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+def test_snapshot_must_be_swapped_on_version_change(profiles):
+    snapshot = get_snapshot()
+    WallProfile.objects.create(id=3, initial_heights=[0])
+    assert get_snapshot() is snapshot
+
+    bump_dataset_version()
+    new_snapshot = get_snapshot()
+    assert new_snapshot is not snapshot
+    assert new_snapshot.profiles_num() == 3
+    assert new_snapshot.profile_daily_volume(3, 30) > 0
+    # The old snapshot stays intact for readers still holding it
+    assert snapshot.profiles_num() == 2
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+def test_snapshot_must_refresh_changed_profiles_only(profiles, django_assert_num_queries):
+    snapshot = get_snapshot()
+    WallProfile.objects.filter(id=1).update(initial_heights=bytes([0, 0]))
+    WallProfile.objects.filter(id=2).delete()
+    WallProfile.objects.create(id=3, initial_heights=[29])
+    bump_dataset_version({1, 2, 3})
+
+    with django_assert_num_queries(1):
+        new_snapshot = get_snapshot()
+
+    assert new_snapshot.profiles_num() == 2
+    for day in range(1, 32):
+        assert new_snapshot.profile_daily_volume(1, day) == get_daily_volume(day, make_histogram([0, 0]))
+        assert new_snapshot.profile_daily_volume(3, day) == get_daily_volume(day, make_histogram([29]))
+        assert new_snapshot.all_profiles_daily_volume(day) == get_daily_volume(day, make_histogram([0, 0, 29]))
+
+    with pytest.raises(WallProfile.DoesNotExist):
+        new_snapshot.profile_daily_volume(2, 1)
@@ -0,0 +1,171 @@
+from django.conf import settings
+
+from wall_tracker.models import WallProfile
+
+import numpy as np
+from array import array
+import mmap
+import contextlib
+import os
+import struct
+import threading
+import logging
+
+
+_logger = logging.getLogger(__name__)
+
+
+# Binary profile store layout, all integers are little-endian:
+#   header:  magic, profiles number, sections number, table offset
+#   heights: one byte per section, profiles one after another
+#   table:   profile ids (uint32 * profiles), aligned to 8 bytes
+#            section offsets (uint64 * (profiles + 1))
+# The table goes last so the store can be written in one pass without knowing the profiles number ahead.
+MAGIC = b'WALLPRF1'
+HEADER = struct.Struct('<8sQQQ')
+
+
+class ProfileStoreError(Exception):
+    pass
+
+
+class ProfileStoreWriter:
+    def __init__(self, path):
+        self.__path = str(path)
+        self.__tmp_path = f'{self.__path}.{os.getpid()}.tmp'
+        self.__file = open(self.__tmp_path, 'wb')
+        self.__file.write(bytes(HEADER.size))
+        self.__ids = array('I')
+        self.__offsets = array('Q', [0])
+        self.__committed = False
+
+
+    def add(self, profile_id, heights):
+        if self.__ids and profile_id <= self.__ids[-1]:
+            raise ProfileStoreError(f'Profiles must be added in ascending id order: [{profile_id}]')
+
+        n = self.__file.write(heights if isinstance(heights, (bytes, bytearray, memoryview)) else bytes(heights))
+        self.__ids.append(profile_id)
+        self.__offsets.append(self.__offsets[-1] + n)
+
+
+    def commit(self):
+        f = self.__file
+        sections_num = self.__offsets[-1]
+        table_offset = HEADER.size + sections_num
+        table_offset += -table_offset % 8
+        f.write(bytes(table_offset - HEADER.size - sections_num))
+        f.write(self.__ids.tobytes())
+        f.write(bytes(-f.tell() % 8))
+        f.write(self.__offsets.tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(self.__ids), sections_num, table_offset))
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        # Processes that mapped the previous store keep reading it until they reopen
+        os.replace(self.__tmp_path, self.__path)
+        self.__committed = True
+
+
+    # No-op once committed, an error raised after the store has been published leaves it in place
+    def abort(self):
+        if self.__committed:
+            return
+
+        self.__file.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.__tmp_path)
+
+
+def write_profile_store(path, profiles):
+    writer = ProfileStoreWriter(path)
+    try:
+        for profile_id, heights in profiles:
+            writer.add(profile_id, heights)
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.commit()
+
+
+class ProfileStore:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.__inode = os.fstat(f.fileno()).st_ino
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        mm = self.__mmap
+        magic, profiles_num, sections_num, table_offset = HEADER.unpack_from(mm)
+        if magic != MAGIC:
+            raise ProfileStoreError(f'Not a profile store: [{path}]')
+
+        ids_size = profiles_num * 4
+        offsets_offset = table_offset + ids_size + (-(table_offset + ids_size) % 8)
+        # Views straight into the mapping, no copies are made
+        self.__heights = np.frombuffer(mm, dtype=np.uint8, count=sections_num, offset=HEADER.size)
+        self.__ids = np.frombuffer(mm, dtype='<u4', count=profiles_num, offset=table_offset)
+        self.__offsets = np.frombuffer(mm, dtype='<u8', count=profiles_num + 1, offset=offsets_offset)
+
+
+    def inode(self):
+        return self.__inode
+
+
+    def profiles_num(self):
+        return len(self.__ids)
+
+
+    def sections_num(self):
+        return len(self.__heights)
+
+
+    def profile_ids(self):
+        return self.__ids
+
+
+    def offsets(self):
+        return self.__offsets
+
+
+    def heights(self, profile_id=None):
+        if profile_id is None:
+            return self.__heights
+
+        i = int(np.searchsorted(self.__ids, profile_id))
+        if i == len(self.__ids) or self.__ids[i] != profile_id:
+            raise KeyError(profile_id)
+
+        return self.__heights[self.__offsets[i]:self.__offsets[i + 1]]
+
+
+_store = None
+_lock = threading.Lock()
+
+
+# Returns the store of this process reopening it if import_profile has replaced the file.
+# The store is written from the database if there is none yet.
+def get_profile_store():
+    global _store
+    path = settings.WALL_TRACKER_PROFILE_STORE_FILE
+    store = _store
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        inode = None
+
+    if store is not None and store.inode() == inode:
+        return store
+
+    with _lock:
+        if inode is None:
+            _logger.info(f'No profile store found, writing it from the database: [{path}]')
+            write_profile_store(path, WallProfile.objects.order_by('id').values_list('id', 'initial_heights').iterator())
+            inode = os.stat(path).st_ino
+
+        if _store is None or _store.inode() != inode:
+            _store = ProfileStore(path)
+            _logger.info(f'Profile store mapped: [{path}; profiles: {_store.profiles_num()}; sections: {_store.sections_num()}]')
+
+        return _store
@@ -0,0 +1,93 @@
+import pytest
+import random
+
+import numpy as np
+
+from wall_tracker.models import WallProfile, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker.store import (ProfileStore, ProfileStoreWriter, ProfileStoreError, write_profile_store, 
+                                get_profile_store)
+
+
+@pytest.fixture
+def profiles():
+    return [[random.randint(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT) for _ in range(random.randint(1, 100))] for _ in range(7)]
+
+
+@pytest.fixture
+def store_file(settings, tmp_path):
+    fn = settings.WALL_TRACKER_PROFILE_STORE_FILE = tmp_path / 'profiles.bin'
+    return fn
+
+
+def test_store_must_read_what_was_written(store_file, profiles):
+    write_profile_store(store_file, enumerate(profiles, 1))
+
+    sut = ProfileStore(store_file)
+    assert sut.profiles_num() == len(profiles)
+    assert sut.sections_num() == sum(len(p) for p in profiles)
+    assert list(sut.profile_ids()) == list(range(1, len(profiles) + 1))
+    assert list(sut.heights()) == [h for p in profiles for h in p]
+    for profile_id, heights in enumerate(profiles, 1):
+        assert list(sut.heights(profile_id)) == heights
+
+    with pytest.raises(KeyError):
+        sut.heights(len(profiles) + 1)
+
+    # Heights are read straight from the mapping
+    assert not sut.heights().flags.owndata
+    assert not sut.heights().flags.writeable
+
+
+def test_store_must_keep_previous_file_on_abort(store_file, profiles):
+    write_profile_store(store_file, enumerate(profiles, 1))
+
+    writer = ProfileStoreWriter(store_file)
+    writer.add(1, [1, 2, 3])
+    writer.abort()
+
+    assert ProfileStore(store_file).profiles_num() == len(profiles)
+    assert list(store_file.parent.iterdir()) == [store_file]
+
+
+def test_abort_must_be_no_op_after_commit(store_file, profiles):
+    writer = ProfileStoreWriter(store_file)
+    writer.add(1, [1, 2, 3])
+    writer.commit()
+    # The next writer of the process reuses the temporary path
+    next_writer = ProfileStoreWriter(store_file)
+    writer.abort()
+
+    next_writer.add(1, [4])
+    next_writer.commit()
+    assert list(ProfileStore(store_file).heights(1)) == [4]
+
+
+def test_store_must_reject_unordered_profiles(store_file):
+    with pytest.raises(ProfileStoreError):
+        write_profile_store(store_file, [(2, [1]), (1, [2])])
+
+    assert not store_file.exists()
+
+
+def test_store_must_reject_foreign_file(store_file):
+    store_file.write_bytes(bytes(64))
+    with pytest.raises(ProfileStoreError):
+        ProfileStore(store_file)
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+def test_store_must_be_reopened_when_replaced(store_file, profiles):
+    WallProfile.objects.all().delete()
+    WallProfile.objects.create(id=1, initial_heights=[1, 2])
+
+    # Missing store is written from the database
+    store = get_profile_store()
+    assert list(store.heights()) == [1, 2]
+    assert get_profile_store() is store
+
+    write_profile_store(store_file, enumerate(profiles, 1))
+    new_store = get_profile_store()
+    assert new_store is not store
+    assert new_store.profiles_num() == len(profiles)
+    # The previous mapping stays readable
+    assert list(store.heights()) == [1, 2]
@@ -1,6 +1,6 @@
 from django.http import JsonResponse
 from rest_framework.status import HTTP_200_OK, HTTP_404_NOT_FOUND, \
-    HTTP_500_INTERNAL_SERVER_ERROR, HTTP_405_METHOD_NOT_ALLOWED
+    HTTP_500_INTERNAL_SERVER_ERROR, HTTP_405_METHOD_NOT_ALLOWED, HTTP_503_SERVICE_UNAVAILABLE
 import os
 from pathlib import Path
 import logging
@@ -70,3 +70,11 @@ def make_500_internal_server_error_response(request_id):
                             result='error', 
                             desc='Internal server error', 
                             status=HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def make_503_service_unavailable_response(request_id, data=None):
+    return make_response(request_id=request_id, 
+                            data=data,
+                            result='error', 
+                            desc='Service unavailable', 
+                            status=HTTP_503_SERVICE_UNAVAILABLE)
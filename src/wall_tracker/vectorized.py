@@ -0,0 +1,57 @@
+from wall_tracker.models import MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker.histogram import HISTOGRAM_SIZE, MAX_BUILD_DAYS
+
+import numpy as np
+import itertools
+
+
+# Column of the cumulative histogram holding the number of sections in work on days 1..MAX_BUILD_DAYS
+_DAY_COLUMNS = MAX_WALL_HEIGHT - MIN_WALL_HEIGHT - np.arange(1, MAX_BUILD_DAYS + 1)
+
+
+# Packs heights of all the profiles given into one contiguous uint8 array. Returns the array 
+# and per-profile offsets, heights of the i-th profile are heights[offsets[i]:offsets[i + 1]].
+def pack_heights(profiles):
+    profiles = list(profiles)
+    lengths = np.fromiter((len(p) for p in profiles), dtype=np.int64, count=len(profiles))
+    offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if all(isinstance(p, (bytes, bytearray, memoryview)) for p in profiles):
+        # Binary heights are copied as is, without a Python int per section
+        heights = np.frombuffer(b''.join(profiles), dtype=np.uint8)
+    else:
+        heights = np.fromiter(itertools.chain.from_iterable(profiles), dtype=np.uint8, count=offsets[-1])
+
+    return heights, offsets
+
+
+# Returns (profiles, MAX_BUILD_DAYS) matrix of the number of sections in work per profile per day
+def get_daily_sections(heights, offsets):
+    profiles_num = len(offsets) - 1
+    bins = np.repeat(np.arange(profiles_num, dtype=np.int64) * HISTOGRAM_SIZE, np.diff(offsets))
+    bins += heights
+    bins -= MIN_WALL_HEIGHT
+    hists = np.bincount(bins, minlength=profiles_num * HISTOGRAM_SIZE).reshape(profiles_num, HISTOGRAM_SIZE)
+    # A section of height h is in work on days 1..(MAX_WALL_HEIGHT - h)
+    return np.cumsum(hists, axis=1)[:, _DAY_COLUMNS]
+
+
+def get_day_column(daily_sections, day):
+    assert day > 0
+    if day > MAX_BUILD_DAYS:
+        return np.zeros(len(daily_sections), dtype=np.int64)
+
+    return daily_sections[:, day - 1]
+
+
+def count_daily_sections(heights, day):
+    assert day > 0
+    if day > MAX_BUILD_DAYS:
+        return 0
+
+    return int(np.count_nonzero(heights <= MAX_WALL_HEIGHT - day))
+
+
+# Number of (section, day) pairs of work, each section takes one day per missing foot
+def count_total_sections(heights):
+    return MAX_WALL_HEIGHT * len(heights) - int(heights.sum(dtype=np.int64))
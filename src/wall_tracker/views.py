@@ -1,10 +1,15 @@
 from django.shortcuts import render
 from rest_framework.views import APIView
+from django.views import View
 from django.http import JsonResponse
 from django.http import Http404
+from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.status import HTTP_404_NOT_FOUND, HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
 
 from wall_tracker.models import WallProfile, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker.backends import get_backend
+from wall_tracker.admission import get_executor
+from wall_tracker.histogram import ICE_VOLUME_PER_DAY, ICE_UNIT_COST
 from wall_tracker.stuff import make_response, make_400_bad_request_response, \
     make_404_not_found_response, make_500_internal_server_error_response
 
@@ -14,86 +19,65 @@ import logging
 _logger = logging.getLogger(__name__)
 
 
-def get_profile(request, profile_id):
+def get_volume(request, method, *args):
     try:
-        profile = WallProfile.objects.get(id=profile_id)
-        _logger.debug(f'Profile found: [{request.id=}; {profile=}]')
-        return profile
-    except WallProfile.DoesNotExist as e:
+        vol = method(*args)
+        _logger.debug(f'Volume computed: [{request.id=}; {args=}; {vol=}]')
+        return vol
+    except ObjectDoesNotExist as e:
         _logger.debug(f'No profile found: [{request.id=}]', exc_info=e)
         raise Http404(make_404_not_found_response(request.id))
 
 
-ICE_VOLUME_PER_DAY = 195
-ICE_UNIT_COST = 1900
-
-
 def check_value(val):
     if val <= 0:
         raise ValueError(f'Invalid value: [{val}]')
 
 
-def get_total_daily_volume(day, heights):
-    assert day > 0
-    return sum(ICE_VOLUME_PER_DAY for h in heights if (MAX_WALL_HEIGHT - (h + day)) >= 0)
-
-
 class ProfileDailyIceVolumeView(APIView):
     def get(self, request, profile_id, day):
         try:
-            profile = get_profile(request, profile_id)
+            vol = get_volume(request, get_backend().profile_daily_volume, profile_id, day)
         except Http404 as e:
             return e.args[0]
 
-        vol = get_total_daily_volume(day, profile.initial_heights)
         return make_response(request_id=request.id, data=dict(day=day, ice_amount=vol))
 
 
 class ProfileDailyCostView(APIView):
     def get(self, request, profile_id, day):
         try:
-            profile = get_profile(request, profile_id)
+            vol = get_volume(request, get_backend().profile_daily_volume, profile_id, day)
         except Http404 as e:
             return e.args[0]
 
-        cost = get_total_daily_volume(day, profile.initial_heights) * ICE_UNIT_COST
-        return make_response(request_id=request.id, data=dict(day=day, cost=cost))
+        return make_response(request_id=request.id, data=dict(day=day, cost=vol * ICE_UNIT_COST))
 
 
 class AllProfilesDailyCostView(APIView):
     def get(self, request, day):
         try:
-            profiles = WallProfile.objects.all()
-        except Exception:
-            _logger.debug(f'An unexpected error: [{request.id=}]', exc_info=e)
-            return make_500_internal_server_error_response(request.id)
-
-        if len(profiles) == 0:
-            return make_404_not_found_response(request.id)
+            vol = get_volume(request, get_backend().all_profiles_daily_volume, day)
+        except Http404 as e:
+            return e.args[0]
 
-        cost = 0
-        for profile in profiles:
-            cost += get_total_daily_volume(day, profile.initial_heights) * ICE_UNIT_COST
-        return make_response(request_id=request.id, data=dict(day=day, cost=cost))
+        return make_response(request_id=request.id, data=dict(day=day, cost=vol * ICE_UNIT_COST))
 
 
 class TotalWallCostView(APIView):
     def get(self, request):
         try:
-            profiles = WallProfile.objects.all()
-        except Exception:
-            _logger.debug(f'An unexpected error: [{request.id=}]', exc_info=e)
-            return make_500_internal_server_error_response(request.id)
+            vol = get_volume(request, get_backend().total_volume)
+        except Http404 as e:
+            return e.args[0]
 
-        if len(profiles) == 0:
-            return make_404_not_found_response(request.id)
+        return make_response(request_id=request.id, data=dict(day=None, cost=vol * ICE_UNIT_COST))
 
-        cost = 0
-        for profile in profiles:
-            for day in range(1, 31):
-                cost += get_total_daily_volume(day, profile.initial_heights) * ICE_UNIT_COST
 
-        return make_response(request_id=request.id, data=dict(day=None, cost=cost))
+# Executor counters: queue depth, running calls, admitted, rejected, expired and cancelled requests
+class ExecutorStatsView(View):
+    async def get(self, request):
+        return make_response(request_id=request.id, data=get_executor().stats())
 
 
 class NotFoundView(APIView):
@@ -1,11 +1,19 @@
 import pytest
 
 from django.urls import reverse
-from wall_tracker.models import WallProfile
+from wall_tracker.models import WallProfile, DailyAggregate
+from wall_tracker.aggregates import rebuild_aggregates
+from wall_tracker.dataset import bump_dataset_version
+from wall_tracker.store import write_profile_store
 from wall_tracker.stuff import setup_logger
+from wall_tracker import admission, views
+from wall_tracker.admission import get_executor
+from django.test import AsyncClient
+import asyncio
 import logging
 import json
 import re
+import threading
 
 from wall_tracker.views import ICE_VOLUME_PER_DAY, ICE_UNIT_COST
 
@@ -18,16 +26,36 @@ def logger_setup():
     setup_logger()
 
 
+@pytest.fixture(autouse=True, params=['memory', 'aggregates', 'mmap', 'histogram', 'numpy', 'sql'])
+def backend(request, settings, tmp_path):
+    settings.WALL_TRACKER_BACKEND = request.param
+    settings.WALL_TRACKER_DATASET_VERSION_FILE = tmp_path / 'dataset.version'
+    settings.WALL_TRACKER_PROFILE_STORE_FILE = tmp_path / 'profiles.bin'
+
+
+@pytest.fixture(autouse=True)
+def executor(monkeypatch):
+    monkeypatch.setattr(admission, '_executor', None)
+    yield
+    if admission._executor is not None:
+        admission._executor.shutdown()
+
+
 @pytest.fixture
 def clear_db():
     WallProfile.objects.all().delete()
+    DailyAggregate.objects.all().delete()
+    bump_dataset_version()
 
 
 @pytest.fixture
-def profiles(clear_db):
+def profiles(clear_db, settings):
     profile1 = WallProfile.objects.create(id=1, initial_heights=[21, 25, 28])
     profile2 = WallProfile.objects.create(id=2, initial_heights=[17])
     profile3 = WallProfile.objects.create(id=3, initial_heights=[17, 22, 17, 19, 17])
+    rebuild_aggregates()
+    write_profile_store(settings.WALL_TRACKER_PROFILE_STORE_FILE, WallProfile.objects.values_list('id', 'initial_heights'))
+    bump_dataset_version()
     return profile1, profile2, profile3
 
 
@@ -173,3 +201,84 @@ def test_must_return_404_not_if_no_profiles_at_all(clear_db, client, path):
     assert data['meta']['result'] == 'error'
     assert data['meta']['desc'] == 'Not found'
     assert re.match(UUID_REGEX, data['meta']['id']) is not None
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+@pytest.mark.parametrize('path', ['/profiles/0/days/0/', '/profiles/0/overview/0/', '/profiles/4/days/0/', '/profiles/4/overview/0/'])
+def test_must_return_404_not_found_for_unknown_profile_on_day_0(profiles, client, path):
+    response = client.get(path)
+    assert response.status_code == 404
+    assert response.json()['meta']['desc'] == 'Not found'
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'])
+@pytest.mark.parametrize('path', ['/profiles/1/days/1/', '/profiles/1/overview/1/', '/profiles/overview/1/', '/profiles/overview/'])
+def test_must_return_503_service_unavailable_if_overloaded(profiles, client, path, settings):
+    settings.WALL_TRACKER_EXECUTOR_WORKERS = 1
+    settings.WALL_TRACKER_EXECUTOR_QUEUE_SIZE = 0
+    rejected = get_executor().stats()['rejected']
+    started, release = threading.Event(), threading.Event()
+    thread = threading.Thread(target=get_executor().call, args=(lambda: started.set() or release.wait(),))
+    thread.start()
+    assert started.wait(5)
+
+    try:
+        response = client.get(path)
+    finally:
+        release.set()
+        thread.join()
+
+    data = response.json()
+    assert response.status_code == 503
+    assert data['meta']['result'] == 'error'
+    assert data['meta']['desc'] == 'Service unavailable'
+    assert re.match(UUID_REGEX, data['meta']['id']) is not None
+
+    assert client.get(path).status_code == 200
+    stats = client.get('/stats').json()['data']
+    assert (stats['rejected'], stats['waiting'], stats['running']) == (rejected + 1, 0, 0)
+
+
+class BlockedBackend:
+    def __init__(self, started, release):
+        self.__started = started
+        self.__release = release
+
+
+    def profile_daily_volume(self, profile_id, day):
+        self.__started.set()
+        assert self.__release.wait(30)
+        return ICE_VOLUME_PER_DAY
+
+
+@pytest.mark.django_db(databases=['TEST', 'default'], transaction=True)
+def test_concurrent_asgi_requests_over_queue_must_be_shed(profiles, settings, monkeypatch):
+    settings.WALL_TRACKER_EXECUTOR_WORKERS = 1
+    settings.WALL_TRACKER_EXECUTOR_QUEUE_SIZE = 1
+    started, release = threading.Event(), threading.Event()
+    monkeypatch.setattr(views, 'get_backend', lambda: BlockedBackend(started, release))
+
+    async def requests():
+        client = AsyncClient()
+        tasks = [asyncio.ensure_future(client.get('/profiles/1/days/1/')) for _ in range(5)]
+        try:
+            assert await asyncio.to_thread(started.wait, 30)
+            while sum(task.done() for task in tasks) < 3:
+                await asyncio.sleep(0.01)
+
+            # The rest are shed without waiting while the slot holder is still blocked
+            shed = [task.result().status_code for task in tasks if task.done()]
+            stats = get_executor().stats()
+            assert (stats['running'], stats['waiting']) == (1, 1)
+        finally:
+            release.set()
+
+        responses = await asyncio.wait_for(asyncio.gather(*tasks), 30)
+        return shed, [response.status_code for response in responses]
+
+    shed, statuses = asyncio.run(requests())
+    assert shed == [503, 503, 503]
+    # One runs, one waits for it
+    assert sorted(statuses) == [200, 200, 503, 503, 503]
+    stats = get_executor().stats()
+    assert (stats['admitted'], stats['rejected'], stats['running'], stats['waiting']) == (2, 3, 0, 0)
@@ -0,0 +1,154 @@
+from django.conf import settings
+
+from wall_tracker_mp.schedule import Schedule, ScheduleFileError
+
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import struct
+import os
+import logging
+
+
+_logger = logging.getLogger(__name__)
+
+
+SUFFIX = '.schedule'
+LOCK_NAME = '.lock'
+LOCK_POLL_INTERVAL = 0.05
+
+
+# Content hash of the profiles and the team count, the schedule depends on nothing else
+def schedule_key(profiles, teams_num):
+    h = hashlib.blake2b(digest_size=20)
+    h.update(struct.pack('<qQ', teams_num, len(profiles)))
+    for heights in profiles:
+        h.update(struct.pack('<Q', len(heights)))
+        h.update(heights)
+
+    return h.hexdigest()
+
+
+def _path(key):
+    return os.path.join(settings.WALL_TRACKER_MP_CACHE_DIR, key + SUFFIX)
+
+
+# Returns the schedule stored with the key mapped read-only or None. A hit refreshes the entry's 
+# modification time, which is what eviction goes by.
+def get_cached_schedule(key):
+    path = _path(key)
+    try:
+        schedule = Schedule.open(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, ScheduleFileError) as e:
+        _logger.warning(f'Broken schedule cache entry dropped: [{path}; {e}]')
+        os.unlink(path)
+        return None
+
+    os.utime(path)
+    return schedule
+
+
+def put_cached_schedule(key, schedule):
+    os.makedirs(settings.WALL_TRACKER_MP_CACHE_DIR, exist_ok=True)
+    schedule.save(_path(key))
+    evict_cached_schedules(settings.WALL_TRACKER_MP_CACHE_SIZE, keep=key)
+
+
+# Removes least recently used entries until the cache takes max_size bytes at most
+def evict_cached_schedules(max_size, keep=None):
+    cache_dir = settings.WALL_TRACKER_MP_CACHE_DIR
+    entries = list()
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(SUFFIX):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path, entry.name[:-len(SUFFIX)]))
+
+    entries.sort()
+    size = sum(entry[1] for entry in entries)
+    for _, entry_size, path, key in entries:
+        if size <= max_size:
+            break
+
+        if key != keep:
+            # Processes that mapped the entry keep reading it
+            os.unlink(path)
+            size -= entry_size
+            _logger.info(f'Schedule cache entry evicted: [{path}]')
+
+
+def _lock_file():
+    os.makedirs(settings.WALL_TRACKER_MP_CACHE_DIR, exist_ok=True)
+    return open(os.path.join(settings.WALL_TRACKER_MP_CACHE_DIR, LOCK_NAME), 'ab')
+
+
+# Held while a schedule is computed, one process per host computes at a time
+@contextlib.contextmanager
+def cache_lock():
+    with _lock_file() as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# Same as cache_lock() for coroutines, the lock is polled so the event loop is never blocked on it
+@contextlib.asynccontextmanager
+async def async_cache_lock():
+    with _lock_file() as f:
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _publish(key, schedule):
+    put_cached_schedule(key, schedule)
+    # Served from the file like in the other processes, the memory it was computed in is freed
+    cached = get_cached_schedule(key)
+    if cached is None:
+        return schedule
+
+    schedule.close()
+    return cached
+
+
+# Returns the cached schedule of the key, computing it with compute() if there is none. Processes 
+# asking for the same key at once wait for the first one and all of them map the same cache file.
+def get_or_compute_schedule(key, compute):
+    schedule = get_cached_schedule(key)
+    if schedule is not None:
+        return schedule
+
+    with cache_lock():
+        schedule = get_cached_schedule(key)
+        if schedule is not None:
+            return schedule
+
+        return _publish(key, compute())
+
+
+# Same as get_or_compute_schedule(), compute() is a coroutine function
+async def async_get_or_compute_schedule(key, compute):
+    schedule = get_cached_schedule(key)
+    if schedule is not None:
+        return schedule
+
+    async with async_cache_lock():
+        schedule = get_cached_schedule(key)
+        if schedule is not None:
+            return schedule
+
+        # Saving and mapping a large schedule takes a while, the event loop keeps serving meanwhile. Not 
+        # the admission executor, a schedule computed already must not be shed.
+        return await asyncio.to_thread(_publish, key, await compute())
@@ -0,0 +1,141 @@
+import pytest
+import multiprocessing as mp
+import asyncio
+import os
+import time
+import threading
+
+from wall_tracker_mp import cache
+from wall_tracker_mp.cache import (schedule_key, get_cached_schedule, put_cached_schedule, evict_cached_schedules,
+                                   get_or_compute_schedule, async_get_or_compute_schedule, cache_lock)
+from wall_tracker_mp.scheduler import build_schedule
+
+
+PROFILES = [bytes([21, 25, 28]), bytes([17]), bytes([17, 22, 17, 19, 17])]
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(settings, tmp_path):
+    settings.WALL_TRACKER_MP_CACHE_DIR = tmp_path / 'schedules'
+    settings.WALL_TRACKER_MP_CACHE_SIZE = 1024 * 1024
+    return settings.WALL_TRACKER_MP_CACHE_DIR
+
+
+def test_key_must_depend_on_profiles_and_teams():
+    key = schedule_key(PROFILES, 2)
+    assert key == schedule_key([bytearray(p) for p in PROFILES], 2)
+    assert key != schedule_key(PROFILES, 3)
+    assert key != schedule_key(PROFILES[:2], 2)
+    # Same heights split into profiles differently
+    assert schedule_key([bytes([1, 2]), bytes([3])], 1) != schedule_key([bytes([1]), bytes([2, 3])], 1)
+
+
+def test_schedule_must_round_trip():
+    key = schedule_key(PROFILES, 2)
+    assert get_cached_schedule(key) is None
+
+    schedule = build_schedule(PROFILES, 2)
+    put_cached_schedule(key, schedule)
+    cached = get_cached_schedule(key)
+    assert cached.steps() == schedule.steps()
+    assert cached.sections_on_day(3, 2) == schedule.sections_on_day(3, 2)
+    cached.close()
+
+
+def test_broken_entry_must_be_dropped(cache_dir):
+    key = schedule_key(PROFILES, 2)
+    put_cached_schedule(key, build_schedule(PROFILES, 2))
+    path = cache_dir / f'{key}.schedule'
+    path.write_bytes(path.read_bytes()[:-1])
+
+    assert get_cached_schedule(key) is None
+    assert not path.exists()
+
+
+def test_least_recently_used_entries_must_be_evicted(cache_dir, settings):
+    keys = [schedule_key(PROFILES, teams_num) for teams_num in range(1, 5)]
+    for i, key in enumerate(keys):
+        put_cached_schedule(key, build_schedule(PROFILES, i + 1))
+        os.utime(cache_dir / f'{key}.schedule', (i, i))
+
+    # A hit makes the entry the most recently used one
+    get_cached_schedule(keys[0]).close()
+    entry_size = os.path.getsize(cache_dir / f'{keys[0]}.schedule')
+    evict_cached_schedules(2 * entry_size)
+    assert sorted(p.name for p in cache_dir.iterdir()) == sorted(f'{key}.schedule' for key in [keys[0], keys[3]])
+
+
+def compute_once(counter_path, results):
+    def compute():
+        with open(counter_path, 'a') as f:
+            f.write('computed\n')
+
+        time.sleep(0.5)
+        return build_schedule(PROFILES, 2)
+
+    schedule = get_or_compute_schedule(schedule_key(PROFILES, 2), compute)
+    results.put(schedule.steps())
+
+
+def test_schedule_must_be_computed_once_per_host(tmp_path):
+    counter_path = tmp_path / 'counter'
+    results = mp.Queue()
+    processes = [mp.Process(target=compute_once, args=(counter_path, results)) for _ in range(4)]
+    for p in processes:
+        p.start()
+
+    expected = build_schedule(PROFILES, 2).steps()
+    assert [results.get() for _ in processes] == [expected] * len(processes)
+    for p in processes:
+        p.join()
+
+    assert counter_path.read_text() == 'computed\n'
+
+
+def test_async_lookup_must_wait_for_lock_without_blocking_loop(tmp_path):
+    key = schedule_key(PROFILES, 2)
+    ticks = list()
+
+    async def compute():
+        return build_schedule(PROFILES, 2)
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        ticker = asyncio.get_running_loop().create_task(tick())
+        schedule = await async_get_or_compute_schedule(key, compute)
+        ticker.cancel()
+        return schedule
+
+    # Another process computing the same schedule holds the lock for a while
+    with cache_lock():
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(main())
+        loop.run_until_complete(asyncio.sleep(0.3))
+        assert not task.done()
+
+    schedule = loop.run_until_complete(task)
+    loop.close()
+    assert len(ticks) > 5
+    assert schedule.steps() == build_schedule(PROFILES, 2).steps()
+    schedule.close()
+
+
+def test_async_publish_must_not_run_on_loop(monkeypatch):
+    key = schedule_key(PROFILES, 2)
+    threads = list()
+
+    def put(key, schedule):
+        threads.append(threading.current_thread())
+        put_cached_schedule(key, schedule)
+
+    async def compute():
+        return build_schedule(PROFILES, 2)
+
+    monkeypatch.setattr(cache, 'put_cached_schedule', put)
+    schedule = asyncio.run(async_get_or_compute_schedule(key, compute))
+    assert threads and threads[0] is not threading.current_thread()
+    schedule.close()
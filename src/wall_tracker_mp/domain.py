@@ -1,17 +1,87 @@
-import multiprocessing as mp
-import ctypes
-
 from wall_tracker.models import MAX_WALL_HEIGHT
 
+from array import array
+
+
+# Structure of arrays holding the sections of a profile. A section is built a foot a day on consecutive
+# days, so its history is its initial height, start day and steps built. Sections built on other days
+# keep the days of their steps explicitly.
+class SectionColumns:
+    __slots__ = ('profile_id', 'heights', 'start_days', 'built', 'busy', 'irregular_days')
+
+    def __init__(self, heights, profile_id):
+        self.profile_id = profile_id
+        self.heights = array('B', heights)
+        assert all(h <= MAX_WALL_HEIGHT for h in self.heights)
+        self.start_days = array('i', bytes(4 * len(self.heights)))
+        self.built = bytearray(len(self.heights))
+        self.busy = bytearray(len(self.heights))
+        # Days of the steps of sections not built on consecutive days, by section id
+        self.irregular_days = dict()
+
+
+    def __len__(self):
+        return len(self.heights)
+
+
+    def is_completed(self, i):
+        return self.heights[i] + self.built[i] == MAX_WALL_HEIGHT
+
+
+    def build_step(self, i, day):
+        if self.is_completed(i):
+            return
+
+        built = self.built[i]
+        if not built:
+            self.start_days[i] = day
+        elif i in self.irregular_days:
+            self.irregular_days[i].append(day)
+        elif day != self.start_days[i] + built:
+            self.irregular_days[i] = array('i', range(self.start_days[i], self.start_days[i] + built))
+            self.irregular_days[i].append(day)
+
+        self.built[i] = built + 1
+
+
+    def build_steps(self, i, day):
+        if not self.built[i]:
+            self.start_days[i] = day
+            self.built[i] = MAX_WALL_HEIGHT - self.heights[i]
+            return
+
+        while not self.is_completed(i):
+            self.build_step(i, day)
+            day += 1
 
+
+    def steps(self, i):
+        height = self.heights[i]
+        days = self.irregular_days.get(i)
+        if days is None:
+            days = range(self.start_days[i], self.start_days[i] + self.built[i])
+
+        return [(0, height)] + [(day, height + 1 + k) for k, day in enumerate(days)]
+
+
+# A view of one section of SectionColumns
 class WallSection:
+    __slots__ = ('__columns', '__i', '__sid')
+
     def __init__(self, initial_height, section_id, profile_id):
         assert initial_height <= MAX_WALL_HEIGHT
-        size = MAX_WALL_HEIGHT - initial_height + 1
-        self.__steps = [(0, initial_height)]
-        self.__busy = False
+        # A standalone section gets columns of its own
+        self.__columns = SectionColumns([initial_height], profile_id)
+        self.__i = 0
         self.__sid = section_id
-        self.__pid = profile_id
+
+
+    @classmethod
+    def view(cls, columns, section_id):
+        section = cls.__new__(cls)
+        section.__columns = columns
+        section.__i = section.__sid = section_id
+        return section
 
 
     def section_id(self):
@@ -19,34 +89,41 @@ class WallSection:
 
 
     def profile_id(self):
-        return self.__pid
+        return self.__columns.profile_id
+
+
+    def initial_height(self):
+        return self.__columns.heights[self.__i]
 
 
     def set_busy(self):
-        self.__busy = True
+        self.__columns.busy[self.__i] = 1
 
 
     def is_busy(self):
-        return self.__busy
+        return bool(self.__columns.busy[self.__i])
 
 
     def is_completed(self):
-        return self.__steps[-1][1] == MAX_WALL_HEIGHT
+        return self.__columns.is_completed(self.__i)
 
     
     def build_step(self, day):
-        if not self.is_completed():
-            steps = self.__steps
-            prev_step = len(steps) - 1
-            steps.append((day, steps[prev_step][1] + 1))
+        self.__columns.build_step(self.__i, day)
+
 
+    # Builds all the steps left one per day beginning with the day given
+    def build_steps(self, day):
+        self.__columns.build_steps(self.__i, day)
 
+
+    # Materialized on each call
     def steps(self):
-        return list(self.__steps)
+        return self.__columns.steps(self.__i)
 
 
     def steps_num(self):
-        return len(self.__steps) - 1
+        return self.__columns.built[self.__i]
 
 
     def __len__(self):
@@ -54,8 +131,10 @@ class WallSection:
 
 
 class WallProfile:
+    __slots__ = ('__columns', '__profile_id')
+
     def __init__(self, sections, profile_id):
-        self.__sections = list(WallSection(sect, i, profile_id) for i, sect in enumerate(sections))
+        self.__columns = SectionColumns(sections, profile_id)
         self.__profile_id = profile_id
 
 
@@ -63,12 +142,16 @@ class WallProfile:
         return self.__profile_id
 
 
+    def columns(self):
+        return self.__columns
+
+
     def sections(self):
-        return self.__sections
+        return [WallSection.view(self.__columns, i) for i in range(len(self.__columns))]
 
 
     def sections_num(self):
-        return len(self.__sections)
+        return len(self.__columns)
 
 
     def __len__(self):
@@ -76,20 +159,19 @@ class WallProfile:
 
 
     def is_completed(self):
-        return all(s.is_completed() for s in self.__sections)
+        columns = self.__columns
+        return all(h + b == MAX_WALL_HEIGHT for h, b in zip(columns.heights, columns.built))
 
 
     def get_available_section(self):
-        for sect in self.__sections:
-            if not sect.is_busy():
-                return sect
-
-        return None
+        i = self.__columns.busy.find(0)
+        return None if i < 0 else WallSection.view(self.__columns, i)
 
 
     def get_uncompleted_section(self):
-        for sect in self.__sections:
-            if not sect.is_completed():
-                return sect
+        columns = self.__columns
+        for i in range(len(columns)):
+            if not columns.is_completed(i):
+                return WallSection.view(columns, i)
 
         return None
@@ -77,3 +77,21 @@ def test_profile():
     assert sut.get_available_section() is None
 
 
+def test_profile_sections_share_columns():
+    sut = WallProfile([28, 30, 0], profile_id=3)
+    sect = sut.sections()[0]
+    sect.build_steps(5)
+    assert sut.sections()[0].steps() == [(0, 28), (5, 29), (6, 30)]
+    assert sut.sections()[0].is_completed()
+    assert sut.sections()[1].is_completed()
+    assert sut.sections()[2].steps() == [(0, 0)]
+
+    sect = sut.sections()[2]
+    sect.build_step(2)
+    sect.build_steps(10)
+    assert sect.steps() == [(0, 0), (2, 1)] + [(day, day - 8) for day in range(10, 39)]
+    assert sut.is_completed()
+
+    columns = sut.columns()
+    assert list(columns.start_days) == [5, 0, 2]
+    assert list(columns.built) == [2, 0, 30]
@@ -0,0 +1,271 @@
+from wall_tracker.models import MAX_WALL_HEIGHT
+
+import numpy as np
+from multiprocessing import shared_memory
+from collections import namedtuple
+import contextlib
+import mmap
+import os
+import struct
+
+
+# Passed between processes in place of the schedule itself
+ScheduleDescriptor = namedtuple('ScheduleDescriptor', ['name', 'profiles_num', 'sections_num'])
+
+
+# Schedule file: header (magic, profiles number, sections number, per-profile and all-profiles day count 
+# numbers, steps number) followed by the same layout as in shared memory, padded to 8 bytes, and
+# the day index columns. Integers are little-endian.
+MAGIC = b'WALLSCH2'
+HEADER = struct.Struct('<8sQQQQQ')
+
+
+class ScheduleFileError(Exception):
+    pass
+
+
+def _layout(profiles_num, sections_num):
+    # Section offsets per profile (int64 * (profiles + 1)), then start and end days (int32 * sections each)
+    offsets_size = 8 * (profiles_num + 1)
+    days_size = 4 * sections_num
+    return offsets_size, days_size, offsets_size + 2 * days_size
+
+
+def _index_layout(profiles_num, counts_num, all_counts_num):
+    # First days, last days and bases per profile (int64 * profiles each), then per-profile 
+    # and all-profiles day counts (int32)
+    return [('<i8', profiles_num)] * 3 + [('<i4', counts_num), ('<i4', all_counts_num)]
+
+
+# Number of sections worked on each day, per profile and for all profiles. A profile only gets
+# the days from its first to its last worked day, the counts are prefix sums of +1 at the start 
+# and -1 after the end of each section. Queries are O(1).
+class DayIndex:
+    def __init__(self, offsets, first_days, last_days, base, counts, all_counts, steps_num):
+        self.__sections_nums = np.diff(offsets)
+        self.__sections_num = int(offsets[-1])
+        self.__first_days = first_days
+        self.__last_days = last_days
+        self.__base = base
+        self.__counts = counts
+        self.__all_counts = all_counts
+        self.__steps_num = steps_num
+
+
+    @classmethod
+    def build(cls, offsets, start_days, end_days):
+        profiles_num = len(offsets) - 1
+        worked = end_days >= start_days
+        profile_of = np.repeat(np.arange(profiles_num), np.diff(offsets))[worked]
+        start_days = start_days[worked].astype(np.int64)
+        end_days = end_days[worked].astype(np.int64)
+
+        first_days = np.full(profiles_num, np.iinfo(np.int64).max)
+        last_days = np.zeros(profiles_num, dtype=np.int64)
+        np.minimum.at(first_days, profile_of, start_days)
+        np.maximum.at(last_days, profile_of, end_days)
+        first_days[last_days == 0] = 1
+        # One extra slot per profile for the -1 after its last day
+        segments = np.zeros(profiles_num + 1, dtype=np.int64)
+        np.cumsum(last_days - first_days + 2, out=segments[1:])
+        size = int(segments[-1])
+        base = segments[:-1] - first_days
+        counts = (np.bincount(base[profile_of] + start_days, minlength=size) - 
+                  np.bincount(base[profile_of] + end_days + 1, minlength=size))
+
+        last_day = int(last_days.max(initial=0))
+        all_counts = np.bincount(start_days, minlength=last_day + 2) - np.bincount(end_days + 1, minlength=last_day + 2)
+        return cls(offsets, first_days, last_days, base, np.cumsum(counts).astype(np.int32), 
+                   np.cumsum(all_counts).astype(np.int32), int((end_days - start_days + 1).sum()))
+
+
+    # Arrays in _index_layout order
+    def columns(self):
+        return self.__first_days, self.__last_days, self.__base, self.__counts, self.__all_counts
+
+
+    def profiles_num(self):
+        return len(self.__sections_nums)
+
+
+    def sections_on_day(self, day, profile_index=None):
+        if profile_index is None:
+            if day == 0:
+                return self.__sections_num
+
+            return int(self.__all_counts[day]) if day < len(self.__all_counts) else 0
+
+        # Same indexing as of a list of profiles
+        p = range(self.profiles_num())[profile_index]
+        if day == 0:
+            return int(self.__sections_nums[p])
+
+        if day < self.__first_days[p] or day > self.__last_days[p]:
+            return 0
+
+        return int(self.__counts[self.__base[p] + day])
+
+
+    def steps_num(self):
+        return self.__steps_num
+
+
+# Days the sections are worked on: section i gets a foot a day from start_days[i] to end_days[i]
+# inclusive, end is start - 1 for the sections at full height already. Sections of profile p 
+# (zero based) are offsets[p]..offsets[p + 1]. The arrays may live in shared memory or a mapped file.
+class Schedule:
+    def __init__(self, offsets, start_days, end_days, memory=None):
+        self.__offsets = offsets
+        self.__start_days = start_days
+        self.__end_days = end_days
+        self.__memory = memory
+        self.__day_index = None
+
+
+    # Allocates a schedule for the section numbers given in shared memory, days are filled in by the caller
+    @classmethod
+    def create_shared(cls, sections_nums):
+        profiles_num = len(sections_nums)
+        sections_num = sum(sections_nums)
+        offsets_size, days_size, size = _layout(profiles_num, sections_num)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        schedule = cls(*cls.__views(shm.buf, profiles_num, sections_num), shm)
+        schedule.__offsets[0] = 0
+        np.cumsum(sections_nums, out=schedule.__offsets[1:])
+        return schedule
+
+
+    # Maps the shared schedule with no copies made. The name is unlinked at once, 
+    # the memory is freed when the last process unmaps it.
+    @classmethod
+    def attach(cls, descriptor):
+        shm = shared_memory.SharedMemory(descriptor.name)
+        shm.unlink()
+        return cls(*cls.__views(shm.buf, descriptor.profiles_num, descriptor.sections_num), shm)
+
+
+    # Maps a file written by save() read-only, the day index included
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, profiles_num, sections_num, counts_num, all_counts_num, steps_num = HEADER.unpack_from(mm)
+            offset = HEADER.size + _layout(profiles_num, sections_num)[2]
+            offset += -offset % 8
+            columns = list()
+            for dtype, count in _index_layout(profiles_num, counts_num, all_counts_num):
+                columns.append((dtype, count, offset))
+                offset += np.dtype(dtype).itemsize * count
+
+            if magic != MAGIC or len(mm) != offset:
+                raise ScheduleFileError(f'Not a schedule file: [{path}]')
+        except (struct.error, ScheduleFileError):
+            mm.close()
+            raise
+
+        schedule = cls(*cls.__views(mm, profiles_num, sections_num, HEADER.size), mm)
+        schedule.__day_index = DayIndex(schedule.__offsets, 
+                                        *(np.frombuffer(mm, dtype=dtype, count=count, offset=offset) 
+                                          for dtype, count, offset in columns), 
+                                        steps_num)
+        return schedule
+
+
+    @staticmethod
+    def __views(buf, profiles_num, sections_num, offset=0):
+        offsets_size, days_size, _ = _layout(profiles_num, sections_num)
+        return (np.frombuffer(buf, dtype='<i8', count=profiles_num + 1, offset=offset),
+                np.frombuffer(buf, dtype='<i4', count=sections_num, offset=offset + offsets_size),
+                np.frombuffer(buf, dtype='<i4', count=sections_num, offset=offset + offsets_size + days_size))
+
+
+    # Written to a temporary file first, readers see either the old file or the complete new one.
+    # Other processes map the file and share its pages.
+    def save(self, path):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            index = self.day_index()
+            columns = index.columns()
+            with open(tmp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, self.profiles_num(), self.sections_num(), len(columns[3]), len(columns[4]), 
+                                    index.steps_num()))
+                f.write(self.__offsets.astype('<i8').tobytes())
+                f.write(self.__start_days.astype('<i4').tobytes())
+                f.write(self.__end_days.astype('<i4').tobytes())
+                f.write(bytes(-f.tell() % 8))
+                layout = _index_layout(self.profiles_num(), len(columns[3]), len(columns[4]))
+                for (dtype, _), column in zip(layout, columns):
+                    f.write(column.astype(dtype).tobytes())
+
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+
+
+    def descriptor(self):
+        return ScheduleDescriptor(self.__memory.name, self.profiles_num(), self.sections_num())
+
+
+    def close(self):
+        if self.__memory is not None:
+            # Views must be gone before the memory is unmapped
+            self.__offsets = self.__start_days = self.__end_days = self.__day_index = None
+            self.__memory.close()
+            self.__memory = None
+
+
+    def __del__(self):
+        self.close()
+
+
+    def set_section(self, profile_index, section_id, start_day, initial_height):
+        i = self.__offsets[profile_index] + section_id
+        self.__start_days[i] = start_day
+        self.__end_days[i] = start_day + MAX_WALL_HEIGHT - initial_height - 1
+
+
+    def profiles_num(self):
+        return len(self.__offsets) - 1
+
+
+    def sections_num(self):
+        return len(self.__start_days)
+
+
+    # Built on the first call, the schedule must not change after
+    def day_index(self):
+        if self.__day_index is None:
+            self.__day_index = DayIndex.build(self.__offsets, self.__start_days, self.__end_days)
+
+        return self.__day_index
+
+
+    # Number of sections of the profile (of all profiles if None) with a step on the day given. 
+    # Each section has the initial (0, height) step, so all of them are counted for day 0.
+    def sections_on_day(self, day, profile_index=None):
+        return self.day_index().sections_on_day(day, profile_index)
+
+
+    # Total number of steps, i.e. feet built
+    def steps_num(self):
+        return self.day_index().steps_num()
+
+
+    # (day, height) steps per section per profile, the same as built by domain.WallSection
+    def steps(self):
+        offsets = self.__offsets
+        result = list()
+        for p in range(self.profiles_num()):
+            sections = list()
+            for start, end in zip(self.__start_days[offsets[p]:offsets[p + 1]].tolist(), 
+                                  self.__end_days[offsets[p]:offsets[p + 1]].tolist()):
+                height = MAX_WALL_HEIGHT - (end - start + 1)
+                sections.append([(0, height)] + [(start + i, height + 1 + i) for i in range(end - start + 1)])
+
+            result.append(sections)
+
+        return result
@@ -0,0 +1,54 @@
+import pytest
+import random
+import numpy as np
+
+from wall_tracker.models import MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker_mp.schedule import Schedule
+from wall_tracker_mp.scheduler import build_schedule
+
+
+def test_shared_schedule_must_be_attached_without_copies():
+    schedule = Schedule.create_shared([2, 1])
+    schedule.set_section(0, 0, 1, 28)
+    schedule.set_section(0, 1, 1, 30)
+    schedule.set_section(1, 0, 2, 29)
+    descriptor = schedule.descriptor()
+
+    attached = Schedule.attach(descriptor)
+    assert (attached.profiles_num(), attached.sections_num()) == (2, 3)
+    assert attached.steps() == [[[(0, 28), (1, 29), (2, 30)], [(0, 30)]], [[(0, 29), (2, 30)]]]
+    # Both map the same memory
+    schedule.set_section(1, 0, 5, 29)
+    assert attached.steps()[1] == [[(0, 29), (5, 30)]]
+
+    schedule.close()
+    attached.close()
+    with pytest.raises(FileNotFoundError):
+        Schedule.attach(descriptor)
+
+
+def test_sections_on_day():
+    schedule = Schedule(np.array([0, 2, 3]), np.array([1, 1, 3], dtype=np.int32), np.array([2, 0, 3], dtype=np.int32))
+    assert [schedule.sections_on_day(day) for day in range(5)] == [3, 1, 1, 1, 0]
+    assert [schedule.sections_on_day(day, 0) for day in range(5)] == [2, 1, 1, 0, 0]
+    assert schedule.sections_on_day(3, -1) == 1
+    assert schedule.steps_num() == 3
+    with pytest.raises(IndexError):
+        schedule.sections_on_day(1, 2)
+
+
+@pytest.mark.parametrize('iter', range(10))
+def test_day_index_must_match_brute_force(iter):
+    profiles = [[random.randint(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT) for _ in range(random.randint(1, 50))] 
+                for _ in range(random.randint(1, 5))]
+    schedule = build_schedule(profiles, random.randint(1, 10))
+    steps = schedule.steps()
+
+    last_day = max(day for p in steps for sect in p for day, _ in sect)
+    for day in range(last_day + 3):
+        for p in range(-1, len(profiles)):
+            assert schedule.sections_on_day(day, p) == sum(1 for sect in steps[p] if day in dict(sect))
+
+        assert schedule.sections_on_day(day) == sum(1 for p in steps for sect in p if day in dict(sect))
+
+    assert schedule.steps_num() == sum(MAX_WALL_HEIGHT - h for p in profiles for h in p)
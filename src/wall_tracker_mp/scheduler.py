@@ -0,0 +1,176 @@
+from wall_tracker.models import MAX_WALL_HEIGHT
+from wall_tracker_mp.domain import WallProfile
+from wall_tracker_mp.schedule import Schedule, DayIndex
+
+import numpy as np
+from array import array
+import heapq
+import threading
+import sys
+
+
+# Days a team spends on a section, a section already built still takes the team a day
+def section_duration(initial_height):
+    return max(1, MAX_WALL_HEIGHT - initial_height)
+
+
+def _validate(profiles, teams_num):
+    if not profiles:
+        raise ValueError('Empty profiles collection given')
+
+    if teams_num < 1:
+        raise ValueError(f'At least one team is required: [{teams_num}]')
+
+
+# Returns the day each section is started on, per profile. Same schedule the Manager comes to: 
+# teams take sections in profile and section order, all start on day 1 and a team that completes 
+# a section on day d starts the next one on day d + 1. Which team gets a section does not affect
+# the day it is started on, so a min-heap of the days teams get free is enough.
+def schedule_sections(profiles, teams_num):
+    _validate(profiles, teams_num)
+    free_days = [1] * teams_num
+    start_days = list()
+    for heights in profiles:
+        days = list()
+        for height in heights:
+            day = free_days[0]
+            days.append(day)
+            heapq.heapreplace(free_days, day + section_duration(height))
+
+        start_days.append(days)
+
+    return start_days
+
+
+# In-process alternative to the Manager, returns profiles in the same form Manager puts to its output queue
+def simulate(profiles, teams_num):
+    start_days = schedule_sections(profiles, teams_num)
+    result = { i: WallProfile(p, i) for i, p in enumerate(profiles, 1) }
+    for profile, days in zip(result.values(), start_days):
+        for section, day in zip(profile.sections(), days):
+            section.set_busy()
+            section.build_steps(day)
+
+    return result
+
+
+# In-process alternative to the Manager returning the Schedule it would put to shared memory
+def build_schedule(profiles, teams_num):
+    start_days = schedule_sections(profiles, teams_num)
+    offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in profiles], out=offsets[1:])
+    start = np.fromiter((day for days in start_days for day in days), dtype=np.int32, count=offsets[-1])
+    heights = np.frombuffer(b''.join(bytes(p) for p in profiles), dtype=np.uint8)
+    end = (start + (MAX_WALL_HEIGHT - 1 - heights.astype(np.int32))).astype(np.int32)
+    return Schedule(offsets, start, end)
+
+
+# Resumable form of build_schedule(). Sections are handed out in the order of the days they are started on,
+# so the simulation can stop once the sections started by some day are known: days up to the frontier are
+# final, no section handed out later is worked on them. Answers the same way as Schedule does, advancing
+# as far as the day asked. Safe to use from several threads: days up to frontier() are answered from an
+# immutable day index with no locks taken, advancing is done under a lock released every ADVANCE_CHUNK sections.
+class ScheduleBuilder:
+    ADVANCE_CHUNK = 64 * 1024
+
+    def __init__(self, profiles, teams_num):
+        _validate(profiles, teams_num)
+        self.__heights = b''.join(bytes(p) for p in profiles)
+        self.__sections_num = len(self.__heights)
+        self.__offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in profiles], out=self.__offsets[1:])
+        self.__start_days = array('i', bytes(4 * self.__sections_num))
+        self.__end_days = array('i', bytes(4 * self.__sections_num))
+        self.__free_days = [1] * teams_num
+        self.__assigned = 0
+        self.__steps_num = sum(MAX_WALL_HEIGHT - h for h in self.__heights if h < MAX_WALL_HEIGHT)
+        # (frontier, day index of the sections handed out by then), replaced as a whole
+        self.__snapshot = (0, None)
+        self.__lock = threading.Lock()
+
+
+    # Hands out sections started by the day given, limit sections at most. Returns False if there are more.
+    def __advance(self, day, limit=sys.maxsize):
+        heights = self.__heights
+        start_days = self.__start_days
+        end_days = self.__end_days
+        free_days = self.__free_days
+        i = self.__assigned
+        end = min(self.__sections_num, i + limit)
+        while i < end and free_days[0] <= day:
+            start = free_days[0]
+            start_days[i] = start
+            end_days[i] = start + MAX_WALL_HEIGHT - heights[i] - 1
+            heapq.heapreplace(free_days, start + section_duration(heights[i]))
+            i += 1
+
+        self.__assigned = i
+        return i == self.__sections_num or free_days[0] > day
+
+
+    def __frontier(self):
+        if self.__assigned == self.__sections_num:
+            return sys.maxsize
+
+        return self.__free_days[0] - 1
+
+
+    # Days up to the frontier are answered at once
+    def frontier(self):
+        return self.__snapshot[0]
+
+
+    def is_completed(self):
+        return self.__assigned == self.__sections_num
+
+
+    def profiles_num(self):
+        return len(self.__offsets) - 1
+
+
+    def sections_num(self):
+        return self.__sections_num
+
+
+    def __day_index(self, day):
+        snapshot = self.__snapshot
+        while day > snapshot[0]:
+            with self.__lock:
+                done = self.__advance(day, self.ADVANCE_CHUNK)
+                if done and day > self.__snapshot[0]:
+                    n = self.__assigned
+                    self.__snapshot = (self.__frontier(), 
+                                       DayIndex.build(np.minimum(self.__offsets, n),
+                                                      np.frombuffer(self.__start_days, dtype=np.int32, count=n),
+                                                      np.frombuffer(self.__end_days, dtype=np.int32, count=n)))
+
+                snapshot = self.__snapshot
+
+        return snapshot[1]
+
+
+    def sections_on_day(self, day, profile_index=None):
+        if day == 0:
+            # Sections not handed out yet have their initial step too
+            if profile_index is None:
+                return self.__sections_num
+
+            p = range(self.profiles_num())[profile_index]
+            return int(self.__offsets[p + 1] - self.__offsets[p])
+
+        return self.__day_index(day).sections_on_day(day, profile_index)
+
+
+    def steps_num(self):
+        return self.__steps_num
+
+
+    # Simulates the rest of the wall and returns the complete Schedule
+    def finish(self):
+        done = False
+        while not done:
+            with self.__lock:
+                done = self.__advance(sys.maxsize, self.ADVANCE_CHUNK)
+
+        return Schedule(self.__offsets, np.frombuffer(self.__start_days, dtype=np.int32),
+                        np.frombuffer(self.__end_days, dtype=np.int32))
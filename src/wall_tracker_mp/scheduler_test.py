@@ -0,0 +1,151 @@
+import pytest
+import random
+import time
+
+from wall_tracker.models import MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker_mp.worker import Manager
+from wall_tracker_mp.scheduler import schedule_sections, simulate, build_schedule, ScheduleBuilder
+from wall_tracker_mp.schedule import Schedule
+from wall_tracker_mp.stuff import convert_mp_profiles_with_days
+
+
+def random_profiles(profiles_num, max_sections_num):
+    return [[random.randint(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT) for _ in range(random.randint(1, max_sections_num))]
+            for _ in range(profiles_num)]
+
+
+def run_manager(profiles, workers_num, processes_num=None):
+    man = Manager(profiles, workers_num, processes_num)
+    conn = man.result_connection()
+    man.start()
+    return Schedule.attach(conn.recv())
+
+
+def test_schedule_sections():
+    # Team 1: 28 (days 1-2), 30 (day 3), 29 (day 4); team 2: 27 (days 1-3), 0 (days 4-33)
+    assert schedule_sections([[28, 27], [30, 0, 29]], 2) == [[1, 1], [3, 4, 4]]
+    assert schedule_sections([[28, 27]], 5) == [[1, 1]]
+    assert schedule_sections([[28, 27]], 1) == [[1, 3]]
+
+
+def test_simulate():
+    result = convert_mp_profiles_with_days(simulate([[28, 30], [29]], 1))
+    assert result == [[[(0, 28), (1, 29), (2, 30)], [(0, 30)]], [[(0, 29), (4, 30)]]]
+
+
+@pytest.mark.parametrize('profiles, teams_num', [([], 1), ([[1]], 0)])
+def test_schedule_must_reject_invalid_input(profiles, teams_num):
+    with pytest.raises(ValueError):
+        schedule_sections(profiles, teams_num)
+
+
+# Steps of a section started at the height given and built a foot a day from the day given on
+def section_steps(height, first_day=None):
+    return [(0, height)] + [(first_day + i, h) for i, h in enumerate(range(height + 1, MAX_WALL_HEIGHT + 1))]
+
+
+# Schedules produced by the original day-by-day Manager, pinning its semantics for all engines
+BASELINE_SCHEDULES = [
+    # A full-height section still keeps the team that takes it busy for a day
+    ([[29, 30, 28]], 2, [[section_steps(29, 1), section_steps(30), section_steps(28, 2)]]),
+    # More teams than sections
+    ([[25], [28, 29]], 5, [[section_steps(25, 1)], [section_steps(28, 1), section_steps(29, 1)]]),
+    ([[21, 25, 28], [17], [17, 22, 17, 19, 30, 17]], 2,
+     [[section_steps(21, 1), section_steps(25, 1), section_steps(28, 6)],
+      [section_steps(17, 8)],
+      [section_steps(17, 10), section_steps(22, 21), section_steps(17, 23), section_steps(19, 29), section_steps(30),
+       section_steps(17, 37)]]),
+]
+
+
+@pytest.mark.parametrize('profiles, workers_num, expected', BASELINE_SCHEDULES)
+def test_engines_must_match_baseline_schedules(profiles, workers_num, expected):
+    assert convert_mp_profiles_with_days(simulate(profiles, workers_num)) == expected
+    assert build_schedule(profiles, workers_num).steps() == expected
+    assert ScheduleBuilder(profiles, workers_num).finish().steps() == expected
+    assert run_manager(profiles, workers_num, 1).steps() == expected
+
+
+@pytest.mark.parametrize('processes_num', [1, 4])
+@pytest.mark.parametrize('workers_num', [1, 3, 20])
+@pytest.mark.parametrize('iter', range(3))
+def test_simulate_must_match_manager(workers_num, processes_num, iter):
+    profiles = random_profiles(random.randint(1, 4), 60)
+    expected = convert_mp_profiles_with_days(simulate(profiles, workers_num))
+    assert run_manager(profiles, workers_num, processes_num).steps() == expected
+    assert build_schedule(profiles, workers_num).steps() == expected
+
+
+@pytest.mark.parametrize('workers_num', [1, 3, 20])
+@pytest.mark.parametrize('iter', range(3))
+def test_builder_must_match_schedule(workers_num, iter):
+    profiles = random_profiles(random.randint(1, 4), 200)
+    expected = build_schedule(profiles, workers_num)
+    builder = ScheduleBuilder(profiles, workers_num)
+    assert builder.steps_num() == expected.steps_num()
+    days = [0] + random.sample(range(1, 200), 30) + [10_000]
+    for day in days:
+        assert builder.sections_on_day(day) == expected.sections_on_day(day)
+        for p in range(-1, len(profiles)):
+            assert builder.sections_on_day(day, p) == expected.sections_on_day(day, p)
+
+    with pytest.raises(IndexError):
+        builder.sections_on_day(1, len(profiles))
+
+    assert builder.finish().steps() == expected.steps()
+
+
+def test_builder_must_simulate_only_up_to_day_asked():
+    profiles = [[0] * 100]
+    builder = ScheduleBuilder(profiles, 2)
+    assert builder.sections_on_day(0) == 100
+    assert builder.frontier() == 0
+
+    # Each section takes 30 days, two teams
+    assert builder.sections_on_day(45) == 2
+    assert builder.frontier() == 60
+    assert not builder.is_completed()
+
+    assert builder.finish().steps() == build_schedule(profiles, 2).steps()
+    assert builder.is_completed()
+
+
+def test_builder_must_answer_known_days_while_advancing():
+    profiles = [[0] * 100]
+    builder = ScheduleBuilder(profiles, 2)
+    expected = builder.sections_on_day(45)
+
+    # Like a thread advancing the builder
+    with builder._ScheduleBuilder__lock:
+        assert builder.sections_on_day(45) == expected
+        assert builder.sections_on_day(30, 0) == 2
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('workers_num', [10, 100])
+def test_benchmark_simulate(workers_num):
+    profiles = random_profiles(2, 2000)
+    start = time.perf_counter()
+    run_manager(profiles, workers_num)
+    manager_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    simulate(profiles, workers_num)
+    elapsed = time.perf_counter() - start
+    print(f'\nSECTIONS: {sum(len(p) for p in profiles)}, WORKERS: {workers_num}, '
+          f'manager: {manager_elapsed:.3f}s, analytic: {elapsed * 1000:.1f}ms')
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('workers_num', [10, 1000])
+def test_benchmark_early_day(workers_num):
+    profiles = [[random.randint(MIN_WALL_HEIGHT, MAX_WALL_HEIGHT) for _ in range(100_000)] for _ in range(10)]
+    start = time.perf_counter()
+    build_schedule(profiles, workers_num).sections_on_day(3)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ScheduleBuilder(profiles, workers_num).sections_on_day(3)
+    lazy_elapsed = time.perf_counter() - start
+    print(f'\nSECTIONS: {sum(len(p) for p in profiles)}, WORKERS: {workers_num}, '
+          f'complete: {elapsed:.3f}s, lazy day 3: {lazy_elapsed:.3f}s')
@@ -0,0 +1,185 @@
+import multiprocessing as mp
+import asyncio
+import queue
+import threading
+from multiprocessing import shared_memory
+import struct
+import os
+
+
+# Events are sent as messages of fixed-size records: (team id, profile id, section id, day).
+# An empty message asks a worker to quit.
+RECORD = struct.Struct('<iiii')
+
+
+def encode_records(records):
+    return b''.join(RECORD.pack(*record) for record in records)
+
+
+def decode_records(data):
+    return RECORD.iter_unpack(data)
+
+
+# Receives an object from a multiprocessing connection once the event loop finds it readable, 
+# no thread is blocked while waiting. EOFError is raised if the writer is gone.
+async def recv_connection(connection):
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    fd = connection.fileno()
+    loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+    try:
+        await readable
+    finally:
+        loop.remove_reader(fd)
+
+    return connection.recv()
+
+
+# Channels carry messages from any number of processes to one reader, max_records is the most
+# records ever in flight on the channel.
+class QueueChannel:
+    def __init__(self, max_records=None):
+        self.__queue = mp.Queue()
+
+
+    def send(self, data):
+        self.__queue.put(data)
+
+
+    def recv(self):
+        return self.__queue.get()
+
+
+    def close(self):
+        self.__queue.close()
+
+
+# No feeder thread, writes go straight to the pipe. The reading process drains the pipe into memory
+# with a thread of its own, so a writer blocked on a full pipe buffer always gets unblocked, even while 
+# the reader itself is blocked sending to the writer.
+class PipeChannel:
+    def __init__(self, max_records=None):
+        self.__reader, self.__writer = mp.Pipe(duplex=False)
+        # Writes over PIPE_BUF bytes are not atomic
+        self.__lock = mp.Lock()
+        self.__received = None
+        self.__drain_pid = None
+
+
+    def send(self, data):
+        with self.__lock:
+            self.__writer.send_bytes(data)
+
+
+    def __drain(self):
+        received = self.__received
+        try:
+            while True:
+                received.put(self.__reader.recv_bytes())
+        except (EOFError, OSError):
+            # Closed, readers blocked in recv() get an exit message
+            received.put(b'')
+
+
+    def recv(self):
+        # Started by the first recv() of the reading process, threads do not survive fork
+        if self.__drain_pid != os.getpid():
+            self.__drain_pid = os.getpid()
+            self.__received = queue.SimpleQueue()
+            threading.Thread(target=self.__drain, name='pipe-drain', daemon=True).start()
+
+        return self.__received.get()
+
+
+    def close(self):
+        self.__reader.close()
+        self.__writer.close()
+
+
+DEFAULT_RING_CAPACITY = 64 * 1024
+
+
+# Ring buffer in shared memory, messages are stored length-prefixed. Read and write positions
+# grow monotonically and are taken modulo capacity. Sized for max_records the writers never wait.
+class RingChannel:
+    POSITIONS = struct.Struct('<QQ')
+    POSITION = struct.Struct('<Q')
+    LENGTH = struct.Struct('<I')
+
+    def __init__(self, max_records=None):
+        capacity = DEFAULT_RING_CAPACITY
+        if max_records is not None:
+            capacity = max(capacity, (RECORD.size + self.LENGTH.size) * max_records + self.LENGTH.size)
+
+        self.__capacity = capacity
+        self.__shm = shared_memory.SharedMemory(create=True, size=self.POSITIONS.size + capacity)
+        self.__owner = os.getpid()
+        self.__cond = mp.Condition()
+        self.POSITIONS.pack_into(self.__shm.buf, 0, 0, 0)
+
+
+    def __write(self, pos, data):
+        buf = self.__shm.buf
+        capacity = self.__capacity
+        start = self.POSITIONS.size
+        pos %= capacity
+        first = min(len(data), capacity - pos)
+        buf[start + pos:start + pos + first] = data[:first]
+        buf[start:start + len(data) - first] = data[first:]
+
+
+    def __read(self, pos, size):
+        buf = self.__shm.buf
+        capacity = self.__capacity
+        start = self.POSITIONS.size
+        pos %= capacity
+        first = min(size, capacity - pos)
+        return bytes(buf[start + pos:start + pos + first]) + bytes(buf[start:start + size - first])
+
+
+    def send(self, data):
+        size = self.LENGTH.size + len(data)
+        if size > self.__capacity:
+            raise ValueError(f'Message does not fit the ring buffer: [{len(data)}]')
+
+        with self.__cond:
+            while True:
+                read_pos, write_pos = self.POSITIONS.unpack_from(self.__shm.buf)
+                if self.__capacity - (write_pos - read_pos) >= size:
+                    break
+
+                self.__cond.wait()
+
+            self.__write(write_pos, self.LENGTH.pack(len(data)) + data)
+            self.POSITION.pack_into(self.__shm.buf, self.POSITION.size, write_pos + size)
+            self.__cond.notify_all()
+
+
+    def recv(self):
+        with self.__cond:
+            while True:
+                read_pos, write_pos = self.POSITIONS.unpack_from(self.__shm.buf)
+                if read_pos != write_pos:
+                    break
+
+                self.__cond.wait()
+
+            size, = self.LENGTH.unpack(self.__read(read_pos, self.LENGTH.size))
+            data = self.__read(read_pos + self.LENGTH.size, size)
+            self.POSITION.pack_into(self.__shm.buf, 0, read_pos + self.LENGTH.size + size)
+            self.__cond.notify_all()
+
+        return data
+
+
+    def close(self):
+        self.__shm.close()
+        if os.getpid() == self.__owner:
+            self.__shm.unlink()
+
+
+TRANSPORTS = {
+    'queue': QueueChannel,
+    'pipe': PipeChannel,
+    'ring': RingChannel,
+}
@@ -0,0 +1,104 @@
+import pytest
+import multiprocessing as mp
+import random
+import time
+
+from wall_tracker_mp.transport import TRANSPORTS, RingChannel, encode_records, decode_records
+
+
+def echo(iq, oq):
+    while True:
+        data = iq.recv()
+        oq.send(data)
+        if not data:
+            return
+
+
+def produce(oq, producer_id, messages_num):
+    for i in range(messages_num):
+        oq.send(encode_records([(producer_id, i, 0, 0)]))
+
+
+def test_records():
+    records = [(1, 2, 3, 4), (0, 2**31 - 1, 0, -1)]
+    data = encode_records(records)
+    assert len(data) == 32
+    assert list(decode_records(data)) == records
+    assert list(decode_records(b'')) == []
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS.keys())
+def test_channel_must_deliver_messages_in_order(transport):
+    iq = TRANSPORTS[transport]()
+    oq = TRANSPORTS[transport]()
+    process = mp.Process(target=echo, args=(iq, oq))
+    process.start()
+
+    messages = [encode_records([(i, i, i, i)] * random.randint(1, 500)) for i in range(100)] + [b'']
+    for data in messages:
+        iq.send(data)
+        assert oq.recv() == data
+
+    process.join()
+    iq.close()
+    oq.close()
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS.keys())
+def test_channel_must_take_many_writers(transport):
+    PRODUCERS_NUM = 4
+    MESSAGES_NUM = 200
+    oq = TRANSPORTS[transport]()
+    producers = [mp.Process(target=produce, args=(oq, i, MESSAGES_NUM)) for i in range(PRODUCERS_NUM)]
+    for p in producers:
+        p.start()
+
+    received = [list() for _ in range(PRODUCERS_NUM)]
+    for _ in range(PRODUCERS_NUM * MESSAGES_NUM):
+        (producer_id, i, _, _), = decode_records(oq.recv())
+        received[producer_id].append(i)
+
+    for p in producers:
+        p.join()
+
+    oq.close()
+    assert received == [list(range(MESSAGES_NUM))] * PRODUCERS_NUM
+
+
+def test_ring_must_wrap_around_and_reject_oversized_messages():
+    ring = RingChannel()
+    data = bytes(range(256)) * 100
+    for _ in range(20):
+        ring.send(data)
+        assert ring.recv() == data
+
+    with pytest.raises(ValueError):
+        ring.send(bytes(1024 * 1024))
+
+    ring.close()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('records_num', [1, 100])
+@pytest.mark.parametrize('transport', TRANSPORTS.keys())
+def test_benchmark_transport(transport, records_num):
+    MESSAGES_NUM = 20_000
+    iq = TRANSPORTS[transport]()
+    oq = TRANSPORTS[transport]()
+    process = mp.Process(target=echo, args=(iq, oq))
+    process.start()
+    data = encode_records([(1, 2, 3, 4)] * records_num)
+
+    start = time.perf_counter()
+    for _ in range(MESSAGES_NUM):
+        iq.send(data)
+        oq.recv()
+
+    elapsed = time.perf_counter() - start
+    iq.send(b'')
+    oq.recv()
+    process.join()
+    iq.close()
+    oq.close()
+    print(f'\nTRANSPORT: {transport}, RECORDS PER MESSAGE: {records_num}, '
+          f'{2 * MESSAGES_NUM / elapsed:.0f} msgs/s, {2 * MESSAGES_NUM * records_num / elapsed:.0f} records/s')
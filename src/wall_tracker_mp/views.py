@@ -1,129 +1,322 @@
+from django.conf import settings
+from django.db import close_old_connections
 from django.http import JsonResponse
 from django.views import View
 from rest_framework.status import HTTP_404_NOT_FOUND, HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
 
-from wall_tracker.stuff import make_response, make_404_not_found_response
+from wall_tracker.dataset import read_dataset_version
+from wall_tracker.admission import Overloaded, get_executor
+from wall_tracker.stuff import make_response, make_404_not_found_response, make_503_service_unavailable_response
 from wall_tracker_mp.worker import Manager
-from wall_tracker_mp.stuff import convert_mp_profiles, convert_mp_profiles_with_days
+from wall_tracker_mp.scheduler import build_schedule, ScheduleBuilder
+from wall_tracker_mp.schedule import Schedule
+from wall_tracker_mp.transport import recv_connection
+from wall_tracker_mp.cache import schedule_key, get_cached_schedule, async_get_or_compute_schedule
+from wall_tracker_mp.warmup import warm_up_state, start_warm_up, READY, EMPTY
 
 import logging
 import asyncio
 import time
-from collections import Counter
 import threading
+import concurrent.futures
+import weakref
 
 
 _logger = logging.getLogger(__name__)
 
 
-manager = None
-profiles = None
+schedule = None
 
 ICE_VOLUME_PER_DAY = 195
 ICE_UNIT_COST = 1900
 
+async def run_manager(profiles, workers_num):
+    manager = Manager(profiles, workers_num, settings.WALL_TRACKER_MP_PROCESSES, settings.WALL_TRACKER_MP_TRANSPORT)
+    manager.start()
+    try:
+        return Schedule.attach(await recv_connection(manager.result_connection()))
+    except EOFError:
+        raise RuntimeError(f'Manager process failed: [exitcode: {manager.exitcode}]')
+    except asyncio.CancelledError:
+        # E.g. the event loop is shut down, the schedule would never be attached
+        manager.terminate()
+        raise
+
+
+async def run_scheduler(profiles, workers_num):
+    return await get_executor().run(build_schedule, profiles, workers_num)
+
+
+ENGINES = {
+    'process': run_manager,
+    'analytic': run_scheduler,
+}
+
+
+def load_profiles():
+    from wall_tracker.models import WallProfile, TeamsNumber
+
+    try:
+        heights = list(WallProfile.objects.order_by('id').values_list('initial_heights', flat=True))
+        teams = TeamsNumber.objects.all()
+        workers_num = 1 if len(teams) == 0 else teams[0].teams
+        return heights, workers_num
+    finally:
+        # Executor threads outlive requests, their connections are closed like at the end of one
+        close_old_connections()
+
+
+# Returns the schedule of the profiles, a lazy one is a ScheduleBuilder answering while the complete
+# schedule is computed in the background, unless it is cached already
+async def compute_schedule(version, lazy=False):
+    heights, workers_num = await get_executor().run(load_profiles)
+    key = schedule_key(heights, workers_num)
+    engine = settings.WALL_TRACKER_MP_ENGINE
+    if lazy and get_cached_schedule(key) is None:
+        builder = ScheduleBuilder(heights, workers_num)
+        # The analytic engine resumes from where the requests have left the simulation
+        compute = ((lambda: get_executor().run(builder.finish)) if engine == 'analytic' else 
+                   (lambda: ENGINES[engine](heights, workers_num)))
+        completions[builder] = concurrent.futures.Future()
+        threading.Thread(target=finish_schedule, args=(builder, version, key, compute), name='mp-finish', 
+                         daemon=True).start()
+        return builder
+
+    # The schedule and its day index are computed by one process per host
+    # and mapped read-only by the others
+    return await async_get_or_compute_schedule(key, lambda: ENGINES[engine](heights, workers_num))
+
+
+# Single flight: the first caller computes the schedule, the ones coming meanwhile wait for the same future.
+# It is a concurrent future, so callers on any event loop or thread can wait for it. The flight is
+# dropped once it lands, a failed one included, the next caller that needs a schedule starts a new one.
+flight = None
 lock = threading.Lock()
-def start_process():
-    global manager
-    global profiles
+# Flight tasks are referenced until done, the event loop keeps weak references only
+flight_tasks = set()
+# Futures of the complete schedules by the ScheduleBuilder answering until they are ready
+completions = weakref.WeakKeyDictionary()
+
+# Dataset version the schedule has been computed for, a different one in the stamp file means 
+# profiles or the team count have changed since
+schedule_version = None
+# A failed background recompute is not retried for that long, the previous schedule is served meanwhile
+REFRESH_RETRY_DELAY = 5.0
+refresh_failed_at = None
+
+
+def join_flight():
+    global flight
+    with lock:
+        if flight is None:
+            flight = concurrent.futures.Future()
+            return flight, True
+
+        return flight, False
+
+
+async def fly(future):
+    global schedule, schedule_version, flight
+    try:
+        # Taken before the profiles are read, a change made meanwhile triggers one more recompute
+        version = read_dataset_version()
+        # Only a cold start is answered lazily, a recompute has the previous schedule to serve meanwhile
+        result = await compute_schedule(version, lazy=settings.WALL_TRACKER_MP_LAZY and schedule is None)
+        with lock:
+            # Readers holding the previous schedule keep using it, new ones get this one
+            schedule, schedule_version = result, version
+
+        future.set_result(result)
+    except BaseException as e:
+        if isinstance(e, ValueError):
+            with lock:
+                # No profiles any more, requests get 404 instead of the schedule of the previous ones
+                schedule, schedule_version = None, None
+
+        if isinstance(e, asyncio.CancelledError):
+            # The caller that started the flight has gone, the others must not look cancelled
+            future.set_exception(RuntimeError('Schedule computation cancelled'))
+            raise
+
+        future.set_exception(e)
+    finally:
+        with lock:
+            flight = None
+
+
+# Completes the schedule a ScheduleBuilder of the dataset version given has been answering with and swaps it in
+def finish_schedule(builder, version, key, compute):
+    global schedule
+    completion = completions[builder]
+    try:
+        result = asyncio.run(async_get_or_compute_schedule(key, compute))
+    except BaseException as e:
+        _logger.error(f'Schedule completion failed, days keep being simulated on request: [{e}]', exc_info=e)
+        completion.set_exception(e)
+        return
+
     with lock:
-        if manager is None:
-            from wall_tracker.models import WallProfile, TeamsNumber
-
-            profiles = [list(p.initial_heights) for p in WallProfile.objects.all()]
-            teams = TeamsNumber.objects.all()
-            workers_num = 1 if len(teams) == 0 else teams[0].teams
-            manager = Manager(profiles, workers_num)
-            oq = manager.output_queue()
-            manager.start()
-            profiles = oq.get()
-
-        return profiles
+        # Unless a recompute has swapped in a newer one meanwhile
+        if schedule is builder and schedule_version == version:
+            schedule = result
+
+    completion.set_result(result)
+
+    _logger.info(f'Schedule completed: [sections: {builder.sections_num()}]')
+
+
+def recompute():
+    global refresh_failed_at
+    future, owner = join_flight()
+    if not owner:
+        return
+
+    asyncio.run(fly(future))
+    e = future.exception()
+    if e is None or isinstance(e, ValueError):
+        refresh_failed_at = None
+        _logger.info(f'Schedule recomputed: [version: {schedule_version}]')
+    else:
+        refresh_failed_at = time.monotonic()
+        _logger.error(f'Schedule recompute failed, the previous one is served: [{e}]', exc_info=e)
+
+
+# Starts computing the schedule of the current dataset version in the background if the one
+# served is outdated. The served schedule is swapped for the new one once it is ready.
+def refresh_schedule():
+    if schedule is None or flight is not None or read_dataset_version() == schedule_version:
+        return False
+
+    if refresh_failed_at is not None and time.monotonic() - refresh_failed_at < REFRESH_RETRY_DELAY:
+        return False
+
+    threading.Thread(target=recompute, name='mp-recompute', daemon=True).start()
+    return True
+
+
+async def get_schedule():
+    current = schedule
+    if current is not None:
+        refresh_schedule()
+        return current
+
+    future, owner = join_flight()
+    if owner:
+        # No request owns the flight, one going away does not cancel it for the others
+        task = asyncio.get_running_loop().create_task(fly(future))
+        flight_tasks.add(task)
+        task.add_done_callback(flight_tasks.discard)
+
+    return await asyncio.shield(asyncio.wrap_future(future))
+
+
+# Blocking version of get_schedule() for threads, with complete set waits for the complete schedule 
+# if a ScheduleBuilder is answering meanwhile
+def start_process(complete=False):
+    current = schedule
+    if current is not None:
+        refresh_schedule()
+    else:
+        future, owner = join_flight()
+        if owner:
+            asyncio.run(fly(future))
+
+        current = future.result()
+
+    if complete and isinstance(current, ScheduleBuilder):
+        return completions[current].result()
+
+    return current
         
 
-def get_days_for_profile(profiles, profile_id, day):
-    c = Counter()
-    p = profiles[profile_id - 1]
-    for sect in p:
-        d = dict(sect)
-        if day in d:
-            c[day] += 1
+# A lazy schedule may have to simulate up to the day asked, which is done on the executor
+async def sections_on_day(schedule, day, profile_index=None):
+    if isinstance(schedule, ScheduleBuilder) and day > schedule.frontier():
+        return await get_executor().run(schedule.sections_on_day, day, profile_index)
+
+    return schedule.sections_on_day(day, profile_index)
 
-    if not c[day]:
-        raise IndexError
 
-    return c[day]
+async def get_days_for_profile(schedule, profile_id, day):
+    days = await sections_on_day(schedule, day, profile_id - 1)
+    if not days:
+        raise IndexError
 
+    return days
 
-def get_days_for_all_profiles(profiles, day):
-    c = Counter()
-    p = profiles
-    for p in profiles:
-        for sect in p:
-            d = dict(sect)
-            if day in d:
-                c[day] += 1
 
-    if not c[day]:
+async def get_days_for_all_profiles(schedule, day):
+    days = await sections_on_day(schedule, day)
+    if not days:
         raise IndexError
 
-    return c[day]
+    return days
 
 
 class ProfileDailyIceVolumeView(View):
     async def get(self, request, profile_id, day):
-        loop = asyncio.get_running_loop()
-
         try:
-            original_profiles = await loop.run_in_executor(None, start_process)
-            profiles_with_days = convert_mp_profiles_with_days(original_profiles)
-
-            days = get_days_for_profile(profiles_with_days, profile_id, day)
+            schedule = await get_schedule()
+            days = await get_days_for_profile(schedule, profile_id, day)
             ice_amount = days * ICE_VOLUME_PER_DAY
             return make_response(request_id=request.id, data=dict(day=day, ice_amount=ice_amount))
         except (IndexError, ValueError):
             return make_404_not_found_response(request.id)
+        except Overloaded:
+            return make_503_service_unavailable_response(request.id)
 
 
 class ProfileDailyCostView(View):
     async def get(self, request, profile_id, day):
-        loop = asyncio.get_running_loop()
-
         try:
-            original_profiles = await loop.run_in_executor(None, start_process)
-            profiles_with_days = convert_mp_profiles_with_days(original_profiles)
-
-            days = get_days_for_profile(profiles_with_days, profile_id, day)
+            schedule = await get_schedule()
+            days = await get_days_for_profile(schedule, profile_id, day)
             cost = days * ICE_VOLUME_PER_DAY * ICE_UNIT_COST
             return make_response(request_id=request.id, data=dict(day=day, cost=cost))
         except (IndexError, ValueError):
             return make_404_not_found_response(request.id)
+        except Overloaded:
+            return make_503_service_unavailable_response(request.id)
 
 
 class AllProfilesDailyCostView(View):
     async def get(self, request, day):
-        loop = asyncio.get_running_loop()
-
         try:
-            original_profiles = await loop.run_in_executor(None, start_process)
-            profiles_with_days = convert_mp_profiles_with_days(original_profiles)
-
-            days = get_days_for_all_profiles(profiles_with_days, day)
+            schedule = await get_schedule()
+            days = await get_days_for_all_profiles(schedule, day)
             cost = days * ICE_VOLUME_PER_DAY * ICE_UNIT_COST
             return make_response(request_id=request.id, data=dict(day=day, cost=cost))
         except (IndexError, ValueError):
             return make_404_not_found_response(request.id)
+        except Overloaded:
+            return make_503_service_unavailable_response(request.id)
 
 
 class TotalWallCostView(View):
     async def get(self, request):
-        loop = asyncio.get_running_loop()
         try:
-            original_profiles = await loop.run_in_executor(None, start_process)
-            profiles_with_days = convert_mp_profiles_with_days(original_profiles)
-            days = sum(sum(len(sect) - 1 for sect in p) for p in profiles_with_days)
+            schedule = await get_schedule()
+            days = schedule.steps_num()
             cost = days * ICE_VOLUME_PER_DAY * ICE_UNIT_COST
             return make_response(request_id=request.id, data=dict(day=None, cost=cost))
         except ValueError:
             return make_404_not_found_response(request.id)
+        except Overloaded:
+            return make_503_service_unavailable_response(request.id)
+
+
+# Cheap readiness probe, 200 once the complete schedule and its index are built (or there are no profiles), 
+# 503 before.
+# Starts the warm-up if it is on and the server has not, e.g. when it runs without ASGI lifespan, 
+# or retries a failed one. A schedule built by requests makes the server ready as well.
+class ReadyView(View):
+    async def get(self, request):
+        if settings.WALL_TRACKER_MP_WARM_UP:
+            start_warm_up()
+
+        # Not ready while a ScheduleBuilder is answering
+        state = READY if isinstance(schedule, Schedule) else warm_up_state()
+        if state in (READY, EMPTY):
+            return make_response(request_id=request.id, data=dict(state=state))
 
+        return make_503_service_unavailable_response(request.id, data=dict(state=state))
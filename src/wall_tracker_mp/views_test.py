@@ -0,0 +1,403 @@
+import pytest
+import asyncio
+import time
+import threading
+import concurrent.futures
+
+from django.urls import reverse
+from django.core.management import call_command
+from wall_tracker.models import WallProfile, TeamsNumber, MIN_WALL_HEIGHT, MAX_WALL_HEIGHT
+from wall_tracker import admission
+from wall_tracker.admission import get_executor
+from wall_tracker.dataset import bump_dataset_version
+from wall_tracker_mp import views, warmup
+from wall_tracker_mp.views import ICE_VOLUME_PER_DAY, ICE_UNIT_COST
+from wall_tracker_mp.scheduler import simulate, ScheduleBuilder
+from wall_tracker_mp.schedule import Schedule
+from wall_tracker_mp.cache import schedule_key
+from wall_tracker_mp.stuff import convert_mp_profiles_with_days
+
+
+PROFILES = [[21, 25, 28], [17], [17, 22, 17, 19, 30, 17]]
+TEAMS_NUM = 2
+
+
+@pytest.fixture(autouse=True, params=['analytic', 'process', 'analytic-lazy', 'process-lazy'])
+def engine(request, settings, monkeypatch, tmp_path):
+    settings.WALL_TRACKER_MP_ENGINE, _, lazy = request.param.partition('-')
+    settings.WALL_TRACKER_MP_LAZY = bool(lazy)
+    settings.WALL_TRACKER_MP_CACHE_DIR = tmp_path / 'schedules'
+    monkeypatch.setattr(views, 'schedule', None)
+    monkeypatch.setattr(views, 'flight', None)
+    monkeypatch.setattr(views, 'schedule_version', None)
+    monkeypatch.setattr(views, 'refresh_failed_at', None)
+    monkeypatch.setattr(warmup, '_state', warmup.PENDING)
+    monkeypatch.setattr(admission, '_executor', None)
+    settings.WALL_TRACKER_DATASET_VERSION_FILE = tmp_path / 'dataset.version'
+    yield
+    # Background work of the test must not land in the next one
+    for thread in threading.enumerate():
+        if thread.name in ('mp-finish', 'mp-recompute', 'mp-warm-up'):
+            thread.join(30)
+
+
+@pytest.fixture
+def profiles():
+    for i, p in enumerate(PROFILES, 1):
+        WallProfile.objects.create(id=i, initial_heights=p)
+
+    TeamsNumber.objects.create(teams=TEAMS_NUM)
+    return convert_mp_profiles_with_days(simulate(PROFILES, TEAMS_NUM))
+
+
+# The way the views used to count sections, straight from the steps
+def count_sections(profiles, day):
+    return sum(1 for sections in profiles for steps in sections if day in dict(steps))
+
+
+def get_data(client, name, **kwargs):
+    response = client.get(reverse(name, kwargs=kwargs))
+    assert response.status_code == 200
+    return response.json()['data']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_views_must_match_steps(client, profiles):
+    for day in range(0, 40):
+        for profile_id in range(0, len(PROFILES) + 1):
+            # Profile id 0 has always been served as the last profile
+            sections_num = count_sections([profiles[profile_id - 1]], day)
+            if sections_num:
+                data = get_data(client, 'mp-daily-ice-amount', profile_id=profile_id, day=day)
+                assert data == dict(day=day, ice_amount=sections_num * ICE_VOLUME_PER_DAY)
+                data = get_data(client, 'mp-daily-cost', profile_id=profile_id, day=day)
+                assert data == dict(day=day, cost=sections_num * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+            else:
+                response = client.get(reverse('mp-daily-ice-amount', kwargs=dict(profile_id=profile_id, day=day)))
+                assert response.status_code == 404
+
+        sections_num = count_sections(profiles, day)
+        if sections_num:
+            data = get_data(client, 'mp-all-profiles-daily-cost', day=day)
+            assert data == dict(day=day, cost=sections_num * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+        else:
+            assert client.get(reverse('mp-all-profiles-daily-cost', kwargs=dict(day=day))).status_code == 404
+
+    steps_num = sum(MAX_WALL_HEIGHT - h for p in PROFILES for h in p)
+    assert get_data(client, 'mp-total-wall-cost') == dict(day=None, cost=steps_num * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lazy_views_must_match_steps(client, profiles, settings):
+    settings.WALL_TRACKER_MP_LAZY = True
+    for day in [3, 1, 0, 12, 40, 7]:
+        for profile_id in range(0, len(PROFILES) + 1):
+            sections_num = count_sections([profiles[profile_id - 1]], day)
+            response = client.get(reverse('mp-daily-ice-amount', kwargs=dict(profile_id=profile_id, day=day)))
+            if sections_num:
+                assert response.json()['data'] == dict(day=day, ice_amount=sections_num * ICE_VOLUME_PER_DAY)
+            else:
+                assert response.status_code == 404
+
+        sections_num = count_sections(profiles, day)
+        response = client.get(reverse('mp-all-profiles-daily-cost', kwargs=dict(day=day)))
+        if sections_num:
+            assert response.json()['data'] == dict(day=day, cost=sections_num * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+        else:
+            assert response.status_code == 404
+
+    steps_num = sum(MAX_WALL_HEIGHT - h for p in PROFILES for h in p)
+    assert get_data(client, 'mp-total-wall-cost') == dict(day=None, cost=steps_num * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lazy_schedule_must_be_completed_in_background(client, profiles, settings):
+    settings.WALL_TRACKER_MP_LAZY = True
+    expected = count_sections(profiles, 2) * ICE_VOLUME_PER_DAY * ICE_UNIT_COST
+    assert get_data(client, 'mp-all-profiles-daily-cost', day=2)['cost'] == expected
+
+    deadline = time.monotonic() + 30
+    while not isinstance(views.schedule, Schedule) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert isinstance(views.schedule, Schedule)
+    assert len(list(settings.WALL_TRACKER_MP_CACHE_DIR.glob('*.schedule'))) == 1
+    assert get_data(client, 'mp-all-profiles-daily-cost', day=2)['cost'] == expected
+
+
+def test_completed_schedule_must_not_replace_newer_one(monkeypatch):
+    key = schedule_key([bytes(p) for p in PROFILES], TEAMS_NUM)
+    for version, expected in [('v0', ScheduleBuilder), ('v1', Schedule)]:
+        builder = ScheduleBuilder(PROFILES, TEAMS_NUM)
+        views.completions[builder] = concurrent.futures.Future()
+        monkeypatch.setattr(views, 'schedule', builder)
+        monkeypatch.setattr(views, 'schedule_version', 'v1')
+
+        views.finish_schedule(builder, version, key, lambda: get_executor().run(builder.finish))
+        # The completion is handed to the warm-up even if a newer schedule is served
+        assert isinstance(views.completions[builder].result(), Schedule)
+        assert isinstance(views.schedule, expected)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_views_must_return_404_for_unknown_profile(client, profiles):
+    response = client.get(reverse('mp-daily-ice-amount', kwargs=dict(profile_id=len(PROFILES) + 1, day=1)))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('name, kwargs', [('mp-daily-ice-amount', dict(profile_id=1, day=1)), 
+                                          ('mp-all-profiles-daily-cost', dict(day=1)), 
+                                          ('mp-total-wall-cost', dict())])
+def test_views_must_return_404_if_no_profiles_at_all(client, name, kwargs):
+    assert client.get(reverse(name, kwargs=kwargs)).status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_schedule_must_be_loaded_from_cache_after_restart(client, profiles, monkeypatch, settings):
+    settings.WALL_TRACKER_MP_LAZY = False
+    expected = get_data(client, 'mp-daily-cost', profile_id=1, day=3)
+    assert len(list(settings.WALL_TRACKER_MP_CACHE_DIR.glob('*.schedule'))) == 1
+
+    # Restarted process finds the schedule computed before
+    monkeypatch.setattr(views, 'schedule', None)
+    monkeypatch.setattr(views, 'flight', None)
+    monkeypatch.setattr(warmup, '_state', warmup.PENDING)
+    monkeypatch.setattr(views, 'ENGINES', dict())
+    assert get_data(client, 'mp-daily-cost', profile_id=1, day=3) == expected
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_requests_must_share_one_computation(profiles, monkeypatch, settings):
+    settings.WALL_TRACKER_MP_LAZY = False
+    engine = views.ENGINES[settings.WALL_TRACKER_MP_ENGINE]
+    calls = list()
+
+    async def counting_engine(*args):
+        calls.append(args)
+        return await engine(*args)
+
+    monkeypatch.setitem(views.ENGINES, settings.WALL_TRACKER_MP_ENGINE, counting_engine)
+
+    async def requests():
+        return await asyncio.gather(*(views.get_schedule() for _ in range(20)))
+
+    schedules = asyncio.run(requests())
+    assert len(calls) == 1
+    assert all(schedule is schedules[0] for schedule in schedules)
+    assert views.start_process() is schedules[0]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cancelled_request_must_not_fail_the_others(profiles):
+    async def requests():
+        first = asyncio.ensure_future(views.get_schedule())
+        second = asyncio.ensure_future(views.get_schedule())
+        await asyncio.sleep(0)
+        assert views.flight is not None
+        # Like a client disconnecting
+        first.cancel()
+        return await second
+
+    assert asyncio.run(requests()) is views.schedule
+    assert views.schedule is not None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failed_computation_must_be_retried(profiles, monkeypatch, settings):
+    settings.WALL_TRACKER_MP_LAZY = False
+    engine = views.ENGINES[settings.WALL_TRACKER_MP_ENGINE]
+    failures = [RuntimeError('boom')]
+
+    async def failing_engine(*args):
+        if failures:
+            raise failures.pop()
+
+        return await engine(*args)
+
+    monkeypatch.setitem(views.ENGINES, settings.WALL_TRACKER_MP_ENGINE, failing_engine)
+
+    async def requests():
+        return await asyncio.gather(*(views.get_schedule() for _ in range(5)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(requests()))
+    assert views.schedule is None
+    assert views.start_process() is not None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_views_must_return_503_if_overloaded(client, profiles, settings):
+    settings.WALL_TRACKER_EXECUTOR_WORKERS = 1
+    settings.WALL_TRACKER_EXECUTOR_QUEUE_SIZE = 0
+    started, release = threading.Event(), threading.Event()
+    thread = threading.Thread(target=get_executor().call, args=(lambda: started.set() or release.wait(),))
+    thread.start()
+    assert started.wait(5)
+
+    try:
+        response = client.get(reverse('mp-daily-cost', kwargs=dict(profile_id=1, day=1)))
+    finally:
+        release.set()
+        thread.join()
+
+    assert response.status_code == 503
+    assert response.json()['meta']['desc'] == 'Service unavailable'
+    # The failed computation is not kept
+    assert get_data(client, 'mp-daily-cost', profile_id=1, day=1)['cost'] > 0
+
+
+def wait_data(client, name, expected, timeout=30, **kwargs):
+    deadline = time.monotonic() + timeout
+    while True:
+        data = get_data(client, name, **kwargs)
+        if data == expected or time.monotonic() > deadline:
+            return data
+
+        time.sleep(0.05)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_schedule_must_be_recomputed_in_background_on_teams_change(client, profiles):
+    new_profiles = convert_mp_profiles_with_days(simulate(PROFILES, 1))
+    day = next(day for day in range(1, 40) if count_sections(profiles, day) != count_sections(new_profiles, day))
+    old = dict(day=day, cost=count_sections(profiles, day) * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+    new = dict(day=day, cost=count_sections(new_profiles, day) * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+    assert get_data(client, 'mp-all-profiles-daily-cost', day=day) == old
+
+    call_command('teams_num', 1)
+    # The previous schedule is served until the new one is swapped in
+    assert get_data(client, 'mp-all-profiles-daily-cost', day=day) == old
+    assert wait_data(client, 'mp-all-profiles-daily-cost', new, day=day) == new
+    assert views.flight is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_schedule_must_be_recomputed_in_background_on_import(client, profiles):
+    steps_num = sum(MAX_WALL_HEIGHT - h for p in PROFILES for h in p)
+    old = dict(day=None, cost=steps_num * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+    assert get_data(client, 'mp-total-wall-cost') == old
+
+    WallProfile.objects.filter(id=2).update(initial_heights=[16, 29])
+    bump_dataset_version({2})
+    new = dict(day=None, cost=(steps_num + 2) * ICE_VOLUME_PER_DAY * ICE_UNIT_COST)
+    assert wait_data(client, 'mp-total-wall-cost', new) == new
+
+
+@pytest.mark.django_db(transaction=True)
+def test_schedule_must_be_dropped_once_profiles_are_gone(client, profiles):
+    get_data(client, 'mp-total-wall-cost')
+
+    WallProfile.objects.all().delete()
+    bump_dataset_version()
+    deadline = time.monotonic() + 30
+    while client.get(reverse('mp-total-wall-cost')).status_code == 200 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert client.get(reverse('mp-total-wall-cost')).status_code == 404
+
+
+def wait_ready(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get('/ready')
+        if response.status_code == 200 or time.monotonic() > deadline:
+            return response
+
+        assert response.status_code == 503
+        assert response.json()['data']['state'] in (warmup.WARMING, warmup.PENDING, warmup.FAILED)
+        time.sleep(0.05)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ready_must_report_warm_up_state(client, profiles):
+    assert warmup.warm_up_state() == warmup.PENDING
+    response = wait_ready(client)
+    assert response.status_code == 200
+    assert response.json()['data'] == dict(state=warmup.READY)
+    assert views.schedule is not None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ready_must_report_empty_dataset(client):
+    response = wait_ready(client)
+    assert response.status_code == 200
+    assert response.json()['data'] == dict(state=warmup.EMPTY)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ready_must_not_start_warm_up_if_off(client, profiles, settings):
+    settings.WALL_TRACKER_MP_WARM_UP = False
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert warmup.warm_up_state() == warmup.PENDING
+
+    # The schedule built by requests makes the server ready, once it is complete
+    get_data(client, 'mp-total-wall-cost')
+    assert wait_ready(client).json()['data'] == dict(state=warmup.READY)
+    assert warmup.warm_up_state() == warmup.PENDING
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ready_must_retry_failed_warm_up(client, profiles, monkeypatch, settings):
+    settings.WALL_TRACKER_MP_LAZY = False
+    engine = views.ENGINES[settings.WALL_TRACKER_MP_ENGINE]
+    failures = [RuntimeError('boom')]
+
+    async def failing_engine(*args):
+        if failures:
+            raise failures.pop()
+
+        return await engine(*args)
+
+    monkeypatch.setitem(views.ENGINES, settings.WALL_TRACKER_MP_ENGINE, failing_engine)
+    warmup.start_warm_up()
+    deadline = time.monotonic() + 30
+    while warmup.warm_up_state() != warmup.FAILED and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert warmup.warm_up_state() == warmup.FAILED
+    assert wait_ready(client).json()['data'] == dict(state=warmup.READY)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lazy_ready_must_wait_for_complete_schedule(client, profiles, monkeypatch, settings):
+    settings.WALL_TRACKER_MP_LAZY = True
+    release = threading.Event()
+    compute = views.async_get_or_compute_schedule
+
+    async def gated_compute(*args):
+        await asyncio.to_thread(release.wait, 30)
+        return await compute(*args)
+
+    monkeypatch.setattr(views, 'async_get_or_compute_schedule', gated_compute)
+    warmup.start_warm_up()
+    deadline = time.monotonic() + 30
+    while not isinstance(views.schedule, ScheduleBuilder) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    # Requests are answered by the builder, the server is not ready until it is complete
+    assert get_data(client, 'mp-all-profiles-daily-cost', day=1)['day'] == 1
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.json()['data'] == dict(state=warmup.WARMING)
+
+    release.set()
+    assert wait_ready(client).json()['data'] == dict(state=warmup.READY)
+    assert isinstance(views.schedule, Schedule)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lifespan_startup_must_start_warm_up(client, profiles):
+    messages = [dict(type='lifespan.startup'), dict(type='lifespan.shutdown')]
+    sent = list()
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(warmup.lifespan(dict(type='lifespan'), receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert warmup.warm_up_state() != warmup.PENDING
+    assert wait_ready(client).status_code == 200
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db import close_old_connections
+
+import threading
+import logging
+
+
+_logger = logging.getLogger(__name__)
+
+
+PENDING = 'pending'
+WARMING = 'warming'
+READY = 'ready'
+# No profiles imported, there is nothing to compute and requests are answered with 404 at once
+EMPTY = 'empty'
+FAILED = 'failed'
+
+
+_state = PENDING
+_lock = threading.Lock()
+
+
+def warm_up_state():
+    return _state
+
+
+def _warm_up():
+    global _state
+    from wall_tracker_mp.views import start_process
+
+    try:
+        # Lazily answered requests do not make the server ready, the complete schedule does
+        start_process(complete=True)
+        _state = READY
+    except ValueError:
+        _state = EMPTY
+    except BaseException as e:
+        _logger.error(f'Warm-up failed: [{e}]', exc_info=e)
+        _state = FAILED
+    finally:
+        close_old_connections()
+
+    _logger.info(f'Warm-up finished: [state: {_state}]')
+
+
+# Computes the schedule and its index in a background thread unless it is being or has been done,
+# a failed warm-up is started over
+def start_warm_up():
+    global _state
+    with _lock:
+        if _state not in (PENDING, FAILED):
+            return False
+
+        _state = WARMING
+
+    threading.Thread(target=_warm_up, name='mp-warm-up', daemon=True).start()
+    return True
+
+
+# ASGI lifespan protocol, the warm-up is started once the server starts up
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if settings.WALL_TRACKER_MP_WARM_UP:
+                start_warm_up()
+
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -1,59 +1,16 @@
-from wall_tracker_mp.domain import WallProfile
+from wall_tracker_mp.scheduler import section_duration
+from wall_tracker_mp.schedule import Schedule
+from wall_tracker_mp.transport import TRANSPORTS, encode_records, decode_records
 from thewall.settings import LOG_DIR
 
 import multiprocessing as mp
+from multiprocessing import resource_tracker
 import queue
 import logging
 import time
 import os
-from collections import Counter
-
-
-class DayEvent:
-    def __init__(self, day):
-        self.__day = day
-
-    def day(self):
-        return self.__day
-
-    def __str__(self):
-        return f'Day {self.__day}'
-
-
-class NewSectionEvent:
-    def __init__(self, section):
-        section.set_busy()
-        self.__section = section
-
-    def section(self):
-        return self.__section
-
-    def __str__(self):
-        return f'New section: [profile id: {self.__section.profile_id()}, section id: {self.__section.section_id()}]'
-
-
-class WorkerReadyEvent:
-    def __init__(self, worker_id, day, section=None):
-        self.__worker_id = worker_id
-        self.__section = section
-        self.__day = day
-
-    def workder_id(self):
-        return self.__worker_id
-
-    def section(self):
-        return self.__section
-
-    def day(self):
-        return self.__day
-
-    def __str__(self):
-        return f'Worker is ready: [workder id: {self.__worker_id}, section done: {self.__section}, day: {self.__day}]'
-
-
-class ExitEvent:
-    def __str__(self):
-        return 'Exit'
+import heapq
+from collections import Counter, defaultdict, deque
 
 
 LOG_FORMAT = '[%(asctime)s]:%(levelname)-5s:: %(message)s -- {%(filename)s:%(lineno)d:(%(funcName)s)}'
@@ -61,15 +18,28 @@ LOG_FORMATTER = logging.Formatter(LOG_FORMAT)
 LOG_LEVEL = logging.INFO
 
 
+# Logical teams are spread over a pool of worker processes, os.cpu_count() of them by default. 
+# Team t is hosted by worker t % processes_num, events go to and from workers in per-worker batches
+# of (team id, profile id, section id, day) records over the transport given (see TRANSPORTS).
+# The schedule is written to shared memory, its descriptor is sent over the result connection, which
+# is closed with nothing sent if the manager fails.
 class Manager(mp.Process):
-    def __init__(self, profiles, workers_num):
+    def __init__(self, profiles, workers_num, processes_num=None, transport='queue'):
         if not profiles:
             raise ValueError('Empty profiles collection given')
 
         super().__init__()
-        self.__profiles = { i: WallProfile(p, i) for i, p in enumerate(profiles, 1) }
+        self.__heights = [bytes(p) for p in profiles]
+        self.__sections_nums = [len(p) for p in profiles]
+        self.__sections_num = sum(self.__sections_nums)
+        self.__completed_num = 0
         self.__workers_num = workers_num
-        self.__output_queue = mp.Queue()
+        self.__processes_num = max(1, min(workers_num, processes_num or os.cpu_count() or 1))
+        self.__channel_type = TRANSPORTS[transport]
+        self.__result_reader, self.__result_writer = mp.Pipe(duplex=False)
+        # Started by this process so the schedule memory outlives the manager process 
+        # until the caller attaches to it
+        resource_tracker.ensure_running()
         logging.basicConfig(format=LOG_FORMAT)
         logger = self.__logger = logging.getLogger(Manager.__name__)
         logger.setLevel(LOG_LEVEL)
@@ -78,96 +48,138 @@ class Manager(mp.Process):
         logger.addHandler(handler)
 
 
-    def profiles(self):
-        return self.__profiles
+    def result_connection(self):
+        return self.__result_reader
 
 
-    def output_queue(self):
-        return self.__output_queue
+    def start(self):
+        super().start()
+        # Only the manager process keeps the write end, readers get EOF if it dies
+        self.__result_writer.close()
 
 
     def is_completed(self):
-        profiles = self.__profiles
-        return all(p.is_completed() for _, p in profiles.items())
+        return self.__completed_num == self.__sections_num
 
 
+    # Teams get a section with the day to start it on and report the day it is completed on. 
+    # Reports are taken in completion day order: a report is handled once no team still building 
+    # could complete its section earlier, then the team gets the next section starting the day after.
     def run(self):
         logger = self.__logger
-        profiles = self.__profiles
-        oq = self.__workers_output = mp.Queue()
-        workers = self.__workers = { i: Worker(i, mp.Queue(), oq) for i in range(self.__workers_num) }
+        heights = self.__heights
+        sections_nums = self.__sections_nums
+        processes_num = self.__processes_num
+        # A team has one record in flight at most
+        max_records = self.__workers_num
+        channel_type = self.__channel_type
+        oq = self.__workers_output = channel_type(max_records)
+        workers = self.__workers = { i: Worker(i, self.__heights, channel_type(max_records), oq) 
+                                     for i in range(processes_num) }
 
         logger.info('Manager started')
 
+        schedule = Schedule.create_shared(sections_nums)
+        # (profile id, section id) of the sections not handed out yet, in profile and section order
+        pending = deque((profile_id, section_id) for profile_id, sections_num in enumerate(sections_nums, 1)
+                        for section_id in range(sections_num))
         def get_available_section():
-            for _, p in profiles.items():
-                sect = p.get_available_section()
-                if sect is not None:
-                    return sect
-
-            return None
-
-        def send_event_to_all(event):
-            for worker in started_workers:
-                worker.send_event(event)
+            return pending.popleft() if pending else None
 
         def wait_all_exit():
             for worker in started_workers:
-                worker.send_event(ExitEvent())
+                worker.send_event(b'')
                 worker.join()
 
-        day = 1
-        oq = self.__workers_output
-        started_workers = list()
+            for worker in workers.values():
+                worker.input_queue().close()
 
-        for _, worker in workers.items():
-            sect = get_available_section()
-            if sect is not None:
-                worker.send_event(NewSectionEvent(sect))
-                worker.start()
-                started_workers.append(worker)
+            oq.close()
 
-        counter = Counter()
-        send_event_to_all(DayEvent(day))
-        day += 1
+        def add_section(team_id, sect, day):
+            batches[team_id % processes_num].append((team_id, *sect, day))
+            building[team_id] = day
+            heapq.heappush(start_days, (day, team_id))
 
-        while True:
-            try:
-                event = oq.get()
+        def send_batches():
+            for worker_id, events in batches.items():
+                worker = workers[worker_id]
+                # Started first, a batch over the pipe buffer size blocks until the worker reads it
+                if worker.pid is None:
+                    worker.start()
+                    started_workers.append(worker)
+
+                worker.send_event(encode_records(events))
+
+            batches.clear()
+
+        def min_start_day():
+            # Entries of the sections completed since are dropped on the way
+            while building.get(start_days[0][1]) != start_days[0][0]:
+                heapq.heappop(start_days)
+
+            return start_days[0][0]
 
-                sect = event.section()
-                if sect is not None:
-                    profiles[sect.profile_id()].sections()[sect.section_id()] = sect
+        started_workers = list()
+        # New section records to send by worker id
+        batches = defaultdict(list)
+        # Start days of the sections being built by team id, none of them completes before its start day
+        building = dict()
+        start_days = list()
+        # Completed sections per profile id
+        completed = Counter()
+        # (completion day, team id) of the reports not handled yet
+        reports = list()
+
+        try:
+            for team_id in range(self.__workers_num):
+                sect = get_available_section()
+                if sect is None:
+                    break
+
+                add_section(team_id, sect, 1)
+
+            send_batches()
+            while not self.is_completed():
+                if building:
+                    for team_id, profile_id, section_id, day in decode_records(oq.recv()):
+                        schedule.set_section(profile_id - 1, section_id, building.pop(team_id), 
+                                             heights[profile_id - 1][section_id])
+                        heapq.heappush(reports, (day, team_id))
+                        completed[profile_id] += 1
+                        self.__completed_num += 1
+                        if completed[profile_id] == sections_nums[profile_id - 1]:
+                            logger.info(f'Profile is built: [{profile_id=}, {day=}]')
+
+                # Teams completing on the same day start their next sections on the same day, 
+                # so equal days may be handled in any order
+                while reports and (not building or reports[0][0] <= min_start_day()):
+                    day, team_id = heapq.heappop(reports)
                     sect = get_available_section()
                     if sect is not None:
-                        workers[event.workder_id()].send_event(NewSectionEvent(sect))
-
-                ready_day = event.day()
-                counter[ready_day] += 1
-                if counter[ready_day] == len(started_workers):
-                    send_event_to_all(DayEvent(day))
-                    day += 1
-
-                if self.is_completed():
-                    wait_all_exit()
-                    self.__output_queue.put(profiles)
-                    logger.info(f'The wall is built')
-                    return
-            except BaseException as e:
-                logger.error(f'Unexpected error: [{e}]', exc_info=e)
-                return
+                        add_section(team_id, sect, day + 1)
+
+                send_batches()
+
+            wait_all_exit()
+            self.__result_writer.send(schedule.descriptor())
+            schedule.close()
+            logger.info(f'The wall is built')
+        except BaseException as e:
+            logger.error(f'Unexpected error: [{e}]', exc_info=e)
 
 
 class Worker(mp.Process):
-    def __init__(self, wid, input_queue, output_queue):
+    def __init__(self, wid, heights, input_queue, output_queue):
         super().__init__()
         self.__wid = wid
+        self.__heights = heights
         self.__input = input_queue
         self.__output = output_queue
 
 
     def send_event(self, event):
-        self.__input.put(event)
+        self.__input.send(event)
 
 
     def input_queue(self):
@@ -188,38 +200,26 @@ class Worker(mp.Process):
 
         iq = self.__input
         oq = self.__output
+        heights = self.__heights
         logger = self.__logger
-        section = None
         logger.info('Worker started')
        
         while True:
-            event = iq.get()
-            logger.debug(f'Event: {event}, workder id: {self.__wid}')
+            event = iq.recv()
             try:
-                if isinstance(event, ExitEvent):
+                if not event:
                     logger.info('Worker quit')
                     return
-                if isinstance(event, NewSectionEvent):
-                    section = event.section()
-                    logger.debug(f'Pick up new section: [sect id: {section.section_id()}, profile id: {section.profile_id()}]')
-                elif isinstance(event, DayEvent):
-                    day = event.day()
-                    if section is None:
-                        logger.debug('No section available')
-                        oq.put(WorkerReadyEvent(self.__wid, day))
-                        continue
-
-                    section.build_step(day)
-                    if section.is_completed():
-                        steps = section.steps()
-                        section_id = section.section_id()
-                        profile_id = section.profile_id()
-                        logger.info(f'Section is ready: [{day=}, {profile_id=}, {section_id=}, {steps=}]')
-                        oq.put(WorkerReadyEvent(self.__wid, day, section))
-                        section = None
-                        continue
-
-                    oq.put(WorkerReadyEvent(self.__wid, day))
+
+                # A batch of new sections of the teams hosted, completions are reported in one batch too
+                ready = list()
+                for team_id, profile_id, section_id, day in decode_records(event):
+                    logger.debug(f'New section: [{team_id=}, {profile_id=}, {section_id=}, start {day=}], workder id: {self.__wid}')
+                    day += section_duration(heights[profile_id - 1][section_id]) - 1
+                    logger.info(f'Section is ready: [{day=}, {team_id=}, {profile_id=}, {section_id=}]')
+                    ready.append((team_id, profile_id, section_id, day))
+
+                oq.send(encode_records(ready))
             except BaseException as e:
                 logger.error(f'Unexpected error: [{e}]', exc_info=e)
                 return
@@ -9,7 +9,8 @@ from thewall.settings import LOG_DIR
 from wall_tracker.stuff import setup_logger
 from wall_tracker_mp.worker import Manager
 from wall_tracker.models import MAX_WALL_HEIGHT
-from wall_tracker_mp.stuff import convert_mp_profiles
+from wall_tracker_mp.schedule import Schedule
+from wall_tracker_mp.scheduler import build_schedule
 
 
 @pytest.fixture
@@ -48,21 +49,56 @@ def profiles_to_expected(profiles):
 
 
 ITERATIONS = 1
-@pytest.mark.parametrize('workers_num', [10, 25, 50])
+@pytest.mark.parametrize('transport', ['queue', 'pipe', 'ring'])
+@pytest.mark.parametrize('processes_num', [None, 1, 3])
+@pytest.mark.parametrize('workers_num', [10, 25, 50, 1000])
 @pytest.mark.parametrize('iter', [i for i in range(ITERATIONS)])
-def test_workers(log_setup, profiles, workers_num, iter):
-    print(f'ITERATION: {iter}, TOTAL SECTIONS: {sum(len(p) for p in profiles)}, WORKERS: {workers_num}')
+def test_workers(log_setup, profiles, workers_num, processes_num, transport, iter):
+    print(f'ITERATION: {iter}, TOTAL SECTIONS: {sum(len(p) for p in profiles)}, WORKERS: {workers_num}, '
+          f'PROCESSES: {processes_num}, TRANSPORT: {transport}')
     time.sleep(0.5)
 
-    man = Manager(profiles, workers_num)
-    oq = man.output_queue()
+    man = Manager(profiles, workers_num, processes_num, transport)
+    conn = man.result_connection()
     man.start()
-    mp_profiles = oq.get()
+    schedule = Schedule.attach(conn.recv())
     expected = profiles_to_expected(profiles)
-    result = convert_mp_profiles(mp_profiles)
+    result = [[[step[1] for step in sect] for sect in p] for p in schedule.steps()]
     assert expected == result
 
 
+# A batch per worker takes more than one pipe buffer, 64 KiB by default
+@pytest.mark.parametrize('transport', ['queue', 'pipe', 'ring'])
+def test_workers_must_not_block_on_batches_over_pipe_buffer(log_setup, transport):
+    profiles = [[29] * 20_000]
+    man = Manager(profiles, 20_000, 2, transport)
+    conn = man.result_connection()
+    man.start()
+    assert conn.poll(60), 'Manager has not finished'
+    schedule = Schedule.attach(conn.recv())
+    assert schedule.steps() == build_schedule(profiles, 20_000).steps()
+
+
 def test_workers_must_reject_empty_profile():
     with pytest.raises(ValueError):
         man = Manager([], 1)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('transport', ['queue', 'pipe', 'ring'])
+@pytest.mark.parametrize('workers_num', [10, 50, 1000])
+@pytest.mark.parametrize('sections_num', [100_000, 200_000])
+def test_benchmark_manager_scaling(log_setup, workers_num, sections_num, transport):
+    PROFILES_NUM = 10
+    profiles = [[random.randint(0, MAX_WALL_HEIGHT) for _ in range(sections_num // PROFILES_NUM)] for _ in range(PROFILES_NUM)]
+
+    start = time.perf_counter()
+    man = Manager(profiles, workers_num, transport=transport)
+    conn = man.result_connection()
+    man.start()
+    schedule = Schedule.attach(conn.recv())
+    elapsed = time.perf_counter() - start
+
+    assert [[[step[1] for step in sect] for sect in p] for p in schedule.steps()] == profiles_to_expected(profiles)
+    print(f'\nTOTAL SECTIONS: {sections_num}, WORKERS: {workers_num}, TRANSPORT: {transport}, '
+          f'time: {elapsed:.3f}s, {sections_num / elapsed:.0f} sections/s')